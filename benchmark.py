@@ -0,0 +1,83 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import core.conflict_engine as conflict_engine
+import core.vatsim_data_fetch as vatsim_data_fetch
+import main
+import utils.vertical_speed as vertical_speed
+from config import VERTICAL_SPEED_SAMPLES, VERTICAL_SPEED_TTL_SECONDS, VERTICAL_SPEED_SNAPSHOT_SECONDS
+from core.flightplan_route import route_cache
+from core.vatsim_data_fetch import FeedFileFetcher
+from replay import parse_update_timestamp
+from utils import metrics
+from utils.synthetic_feed import airway_legs, generate_feed
+
+DEFAULT_SIZES = (100, 1000, 5000, 20000)
+
+
+def feed_time(path):
+    # The feed's update_timestamp in seconds, used as the probe clock so the
+    # NASR cycle in effect then is used; None (the wall clock) if it has none
+    fetcher = FeedFileFetcher(path)
+    fetcher.fetch_pilots()
+    return None if fetcher.update_timestamp is None else parse_update_timestamp(fetcher.update_timestamp)
+
+
+def run_cycle(path, engine, now):
+    # One cold probe cycle over a feed file, timed stage by stage. The engine
+    # is switched in core.conflict_engine, which every detection path reads.
+    conflict_engine.CONFLICT_ENGINE = engine
+    route_cache.clear()
+    main.reset_probe_state()
+    vatsim_data_fetch.default_fetcher = FeedFileFetcher(path)
+    # Benchmarks never read or write the persisted vertical speed snapshot
+    vertical_speed.tracker = vertical_speed.VerticalSpeedTracker(None, VERTICAL_SPEED_SAMPLES, VERTICAL_SPEED_TTL_SECONDS,
+                                                                 VERTICAL_SPEED_SNAPSHOT_SECONDS)
+
+    main.get_aircraft_conflict_status(now)
+    cycle = metrics.last_cycle.as_dict()
+    del cycle['time']
+    cycle['mode'] = main.probe_mode()
+    return cycle
+
+
+def run(sources, engines, repeat, output):
+    for source, path in sources:
+        now = feed_time(path)
+        for engine in engines:
+            for run_index in range(repeat):
+                result = {'source': source, 'engine': engine, 'run': run_index}
+                result.update(run_cycle(path, engine, now))
+                output.write(json.dumps(result) + '\n')
+                output.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time each probe stage on synthetic or recorded VATSIM feeds. "
+                                                 "Writes one JSON object per run.")
+    parser.add_argument('--sizes', type=int, nargs='*', default=list(DEFAULT_SIZES),
+                        help="synthetic feed sizes in aircraft (default: %(default)s)")
+    parser.add_argument('--snapshots', nargs='*', default=[], help="recorded feed files (.json or .json.gz) to replay")
+    parser.add_argument('--engines', nargs='*', default=['cpa', 'step'], choices=['cpa', 'step'])
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="append results to this file instead of stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        sources = [(path, path) for path in args.snapshots]
+        legs = airway_legs() if args.sizes else None
+        for size in args.sizes:
+            path = os.path.join(directory, f'synthetic_{size}.json')
+            with open(path, 'w') as f:
+                json.dump(generate_feed(size, args.seed, legs=legs), f)
+            sources.append((f'synthetic:{size}', path))
+
+        if args.output:
+            with open(args.output, 'a') as output:
+                run(sources, args.engines, args.repeat, output)
+        else:
+            run(sources, args.engines, args.repeat, sys.stdout)
@@ -3,6 +3,7 @@ import inspect
 REPEAT_TIME=15
 
 VATSIM_DATA_URL = "https://data.vatsim.net/v3/vatsim-data.json"
+VATSIM_FETCH_TIMEOUT_SECONDS = 10
 
 # USA Coords
 BOTTOM_LEFT_LIMIT = (32, -130)
@@ -12,6 +13,19 @@ TOP_RIGHT_LIMIT = (48, -62.6)
 # BOTTOM_LEFT_LIMIT = (33.5, -82.5)
 # TOP_RIGHT_LIMIT = (41, -71.5)
 
+# Facility regions probed from one shared ingest and prediction pass, each with its own
+# alerts; None probes the single box above. A region is a 'box' or a (lat, lon) 'polygon'
+# and can override any of lateral_red_nm, vertical_red_ft, lateral_yellow_nm, vertical_yellow_ft.
+# The ingest box then covers every region, padded so traffic that can still reach alert separation
+# with an aircraft inside is ingested; REGION_MAX_GROUND_SPEED_KT bounds how far it flies meanwhile.
+FACILITY_REGIONS = None
+REGION_MAX_GROUND_SPEED_KT = 700
+# FACILITY_REGIONS = [
+#     {'name': 'ZDC', 'box': ((33.5, -82.5), (41, -71.5))},
+#     {'name': 'ZNY', 'polygon': [(39.5, -77.0), (42.5, -77.0), (42.0, -71.5), (39.0, -72.0)],
+#      'lateral_red_nm': 3.0, 'lateral_yellow_nm': 8.0},
+# ]
+
 ALTITUDE_LIMIT_FT = 10000
 VS_ZERO_RANGE = (-150, 150)
 
@@ -26,14 +40,67 @@ LATERAL_SEPARATION_YELLOW_NM = 12.0
 VERTICAL_SEPARATION_YELLOW_FT = 1000.0
 VERTICAL_TOLERANCE_FT = 150
 
+# 'cpa' solves closest approach per leg pair, 'step' samples every PREDICTION_PRECISION_MINUTES
+CONFLICT_ENGINE = 'cpa'
+
+# A conflict is alerted after CONFLICT_RAISE_CYCLES consecutive detections and cleared after
+# CONFLICT_CLEAR_CYCLES consecutive cycles without one, not counting cycles in which the engine
+# still predicts the pair inside the minima widened by the clear margins.
+# A lower severity replaces the alerted one only after CONFLICT_CLEAR_CYCLES cycles as well.
+CONFLICT_RAISE_CYCLES = 1
+CONFLICT_CLEAR_CYCLES = 2
+CONFLICT_CLEAR_MARGIN_NM = 1.0
+CONFLICT_CLEAR_MARGIN_FT = 200
+
+# Keep CPA state across cycles and only recompute aircraft that changed beyond these tolerances
+INCREMENTAL_PROBING = False
+INCREMENTAL_MAX_AGE_MINUTES = 2
+INCREMENTAL_POSITION_TOLERANCE_NM = 1.0
+INCREMENTAL_ALTITUDE_TOLERANCE_FT = 200
+INCREMENTAL_SPEED_TOLERANCE_KT = 15
+INCREMENTAL_TRACK_TOLERANCE_DEG = 5
+INCREMENTAL_VS_TOLERANCE_FPM = 300
+INCREMENTAL_DEVIATION_TOLERANCE_NM = 0.5
+
+# Per-cycle stage timings and counters: JSON lines appended to METRICS_LOG_FILE and/or
+# Prometheus text served on http://127.0.0.1:METRICS_PORT/metrics (None disables each)
+METRICS_LOG_FILE = None
+METRICS_PORT = None
+
+# service.py: current conflicts on /conflicts, snapshot + per-cycle deltas as server-sent events on /events
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8080
+SERVICE_KEEPALIVE_SECONDS = 15
+SERVICE_QUEUE_SIZE = 64
+# Conflict times are published as clock seconds; a pair is re-sent when its level changes or
+# its conflict time moves by more than this
+SERVICE_CONFLICT_TIME_TOLERANCE_SECONDS = 30
+
+# Shard CPA pair evaluation over a process pool by lat/lon tiles (0 workers = one per CPU)
+PARALLEL_PROBING = False
+PARALLEL_WORKERS = 0
+PARALLEL_TILE_DEG = 5.0
+
+# NAVDATA_PATH holds one NASR cycle, or one YYYY-MM-DD directory per cycle with the same
+# file names; the cycle in effect at the probe clock (the snapshot time in replays) is loaded. The
+# directories are re-scanned every NAVDATA_CHECK_SECONDS and the next cycle preloaded before it takes effect
 NAVDATA_PATH = "navdata_feather/"
+NAVDATA_CHECK_SECONDS = 3600
 FIX_FILE = NAVDATA_PATH + "FIX_BASE.feather"
 NAV_FILE = NAVDATA_PATH + "NAV_BASE.feather"
 AWY_FILE = NAVDATA_PATH + "AWY_BASE.feather"
 APT_FILE = NAVDATA_PATH + "APT_BASE.feather"
 FILE_READ_MODE = 'feather'
+# Built with `python -m utils.navdata_cache`, used instead of the files above while it is up to date
+NAVDATA_CACHE_FILE = NAVDATA_PATH + "navdata.bin"
+
+ROUTE_CACHE_SIZE = 4096
+ROUTE_CACHE_TTL_SECONDS = 3600
 
-VERTICAL_SPEED_CACHE_FILE = "data/vertical_speed_data.json"
+VERTICAL_SPEED_CACHE_FILE = "data/vertical_speed_data.bin"
+VERTICAL_SPEED_SAMPLES = 4
+VERTICAL_SPEED_TTL_SECONDS = 600
+VERTICAL_SPEED_SNAPSHOT_SECONDS = 300
 
 def print_config_vars():
     for name, val in globals().items():
@@ -0,0 +1,34 @@
+class Aircraft:
+    # One reported flight: the feed fields plus its conflict result. The probe
+    # itself works on AircraftTable columns; these records are only built for
+    # output.
+    __slots__ = (
+        'callsign', 'latitude', 'longitude', 'altitude', 'ground_speed', 'heading',
+        'departure', 'arrival', 'route', 'cruising_altitude', 'vertical_speed',
+        'conflict_status', 'conflicting_callsign', 'conflict_time_minutes_ahead',
+        'conflict_level', 'conflict_cpa_distance_nm', 'conflict_onset',
+    )
+
+    def __init__(self, callsign, latitude, longitude, altitude, ground_speed, heading,
+                 departure, arrival, route, cruising_altitude, vertical_speed=0):
+        self.callsign = callsign
+        self.latitude = latitude
+        self.longitude = longitude
+        self.altitude = altitude
+        self.ground_speed = ground_speed
+        self.heading = heading
+        self.departure = departure
+        self.arrival = arrival
+        self.route = route
+        self.cruising_altitude = cruising_altitude
+        self.vertical_speed = vertical_speed
+
+        self.conflict_status = 0
+        self.conflicting_callsign = None
+        self.conflict_time_minutes_ahead = None
+        self.conflict_level = None
+        self.conflict_cpa_distance_nm = None
+        self.conflict_onset = None
+
+    def __repr__(self):
+        return f"Aircraft({self.callsign!r}, {self.latitude}, {self.longitude}, {self.altitude})"
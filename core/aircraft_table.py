@@ -0,0 +1,119 @@
+import numpy as np
+
+from core.aircraft import Aircraft
+from core.collision import get_status_text
+
+# Column order of the rows produced by the feed ingest
+FEED_COLUMNS = ('callsign', 'latitude', 'longitude', 'altitude', 'ground_speed', 'heading',
+                'departure', 'arrival', 'route', 'cruising_altitude')
+
+
+class AircraftTable:
+    # Struct-of-arrays state for one probe cycle. Numeric state lives in NumPy
+    # columns indexed by row; callsign_index maps a callsign to its row.
+    # Expanded routes are deduplicated and stored once in a flat coordinate
+    # buffer, with route_offsets[k]:route_offsets[k + 1] holding route k.
+    def __init__(self, rows):
+        columns = list(zip(*rows)) if rows else [()] * len(FEED_COLUMNS)
+        n = len(rows)
+
+        self.callsigns = list(columns[0])
+        self.callsign_index = {callsign: i for i, callsign in enumerate(self.callsigns)}
+        self.latitude = np.array(columns[1], dtype=float)
+        self.longitude = np.array(columns[2], dtype=float)
+        self.altitude = np.array(columns[3], dtype=float)
+        self.ground_speed = np.array([np.nan if gs is None else gs for gs in columns[4]], dtype=float)
+        self.heading = np.array([np.nan if trk is None else trk for trk in columns[5]], dtype=float)
+        self.departures = list(columns[6])
+        self.arrivals = list(columns[7])
+        self.routes = list(columns[8])
+        self.cruising_altitude = np.array([np.nan if crz is None else crz for crz in columns[9]], dtype=float)
+        self.vertical_speed = np.zeros(n)
+
+        self.route_ids = np.full(n, -1, dtype=np.int32)
+        self.route_waypoints = []
+        self.route_geometries = []
+        self.route_coords = np.empty((0, 2))
+        self.route_levels = np.empty(0)
+        self.route_offsets = np.zeros(1, dtype=np.int64)
+
+        self.leg = np.full(n, -1, dtype=np.int32)
+        self.deviation = np.full(n, np.nan)
+
+        self.conflict_status = np.zeros(n, dtype=np.int8)
+        self.conflict_partner = np.full(n, -1, dtype=np.int32)
+        self.conflict_time = np.full(n, np.nan)
+        self.conflict_cpa_distance = np.full(n, np.nan)
+        self.conflict_onset = np.full(n, np.nan)
+
+    def __len__(self):
+        return len(self.callsigns)
+
+    def clear_conflicts(self):
+        self.conflict_status[:] = 0
+        self.conflict_partner[:] = -1
+        self.conflict_time[:] = np.nan
+        self.conflict_cpa_distance[:] = np.nan
+        self.conflict_onset[:] = np.nan
+
+    def set_routes(self, entries):
+        # entries[i] is the expanded route entry of row i; rows sharing an
+        # entry share its slice of the coordinate buffer
+        route_ids = {}
+        coords = []
+        levels = []
+        offsets = [0]
+        for i, entry in enumerate(entries):
+            route_id = route_ids.get(id(entry))
+            if route_id is None:
+                route_id = len(self.route_waypoints)
+                route_ids[id(entry)] = route_id
+                self.route_waypoints.append(entry['waypoints'])
+                self.route_geometries.append(entry['geometry'])
+                coords.append(entry['coords'])
+                levels.append(entry['levels'])
+                offsets.append(offsets[-1] + len(entry['coords']))
+            self.route_ids[i] = route_id
+
+        if coords:
+            self.route_coords = np.concatenate(coords)
+            self.route_levels = np.concatenate(levels)
+        self.route_offsets = np.array(offsets, dtype=np.int64)
+
+    def route_of(self, i):
+        return self.route_waypoints[self.route_ids[i]]
+
+    def remaining_route_coords(self, i):
+        # Route coordinates from the next waypoint of the current leg onwards
+        route_id = self.route_ids[i]
+        return self.route_coords[self.route_offsets[route_id] + self.leg[i] + 1:self.route_offsets[route_id + 1]]
+
+    def cruising_altitude_at(self, i):
+        crz = self.cruising_altitude[i]
+        return None if np.isnan(crz) else int(crz)
+
+    def target_altitude(self, i):
+        # Level filed in the route for the current leg, else the flight plan
+        # cruising altitude; NaN when neither is known
+        if self.leg[i] >= 0:
+            level = self.route_levels[self.route_offsets[self.route_ids[i]] + self.leg[i]]
+            if not np.isnan(level):
+                return level
+        return self.cruising_altitude[i]
+
+    def target_altitude_at(self, i):
+        target = self.target_altitude(i)
+        return None if np.isnan(target) else int(target)
+
+    def aircraft(self, i):
+        ac = Aircraft(self.callsigns[i], float(self.latitude[i]), float(self.longitude[i]), float(self.altitude[i]),
+                      float(self.ground_speed[i]), float(self.heading[i]), self.departures[i], self.arrivals[i],
+                      self.routes[i], self.cruising_altitude_at(i), int(self.vertical_speed[i]))
+        ac.conflict_status = int(self.conflict_status[i])
+        if self.conflict_partner[i] >= 0:
+            ac.conflicting_callsign = self.callsigns[self.conflict_partner[i]]
+            ac.conflict_time_minutes_ahead = round(float(self.conflict_time[i]), 1)
+            ac.conflict_level = get_status_text(ac.conflict_status)
+            ac.conflict_cpa_distance_nm = None if np.isnan(self.conflict_cpa_distance[i]) else float(self.conflict_cpa_distance[i])
+            ac.conflict_onset = None if np.isnan(self.conflict_onset[i]) else float(self.conflict_onset[i])
+        return ac
@@ -0,0 +1,161 @@
+import json
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import SERVICE_KEEPALIVE_SECONDS, SERVICE_QUEUE_SIZE, SERVICE_CONFLICT_TIME_TOLERANCE_SECONDS
+from core.collision import get_status_text, pair_key
+
+
+def conflict_pairs(alerted, timestamp):
+    # Alerted (callsign, callsign, result) pairs of one cycle keyed by the
+    # sorted callsign pair. Every pair is kept, not just each aircraft's
+    # earliest partner.
+    pairs = {}
+    for callsign, other, result in alerted:
+        key = pair_key(callsign, other)
+        pairs[key] = {
+            'callsigns': list(key),
+            'level': get_status_text(result['status']),
+            # Clock time of the predicted loss of separation, steady while the
+            # prediction is, unlike the minutes ahead
+            'conflict_time': round(timestamp + result['time_minutes_ahead'] * 60),
+            'cpa_distance_nm': None if result['cpa_distance_nm'] is None else round(result['cpa_distance_nm'], 1),
+            'onset': result['onset'],
+        }
+    return pairs
+
+
+def is_updated(previous, pair):
+    # A pair is only re-sent when its level changes or its conflict time moves
+    # by more than the tolerance; the CPA distance rides along with the next
+    # update
+    return previous['level'] != pair['level'] \
+        or abs(previous['conflict_time'] - pair['conflict_time']) > SERVICE_CONFLICT_TIME_TOLERANCE_SECONDS
+
+
+def diff_pairs(previous, current):
+    # (new, updated, cleared) between two conflict_pairs() results
+    new = [pair for key, pair in current.items() if key not in previous]
+    updated = [pair for key, pair in current.items() if key in previous and is_updated(previous[key], pair)]
+    cleared = [list(key) for key in previous if key not in current]
+    return new, updated, cleared
+
+
+class AlertHub:
+    # Latest conflict set and the queues of connected subscribers. Each
+    # subscriber gets one full snapshot when it connects and then only the
+    # delta of every cycle that changed something.
+    def __init__(self, queue_size=SERVICE_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.lock = threading.Lock()
+        self.pairs = {}
+        self.sequence = 0
+        self.timestamp = None
+        self.subscribers = set()
+
+    def snapshot_event(self):
+        return {'type': 'snapshot', 'sequence': self.sequence, 'time': self.timestamp,
+                'pairs': list(self.pairs.values())}
+
+    def snapshot(self):
+        with self.lock:
+            return self.snapshot_event()
+
+    def publish(self, pairs, timestamp):
+        with self.lock:
+            new, updated, cleared = diff_pairs(self.pairs, pairs)
+            # Pairs that were not re-sent keep what subscribers were last sent,
+            # so slow drift still adds up to an update
+            self.pairs = {key: self.pairs[key] if key in self.pairs and not is_updated(self.pairs[key], pair) else pair
+                          for key, pair in pairs.items()}
+            self.timestamp = timestamp
+            if not (new or updated or cleared):
+                return None
+
+            self.sequence += 1
+            delta = {'type': 'delta', 'sequence': self.sequence, 'time': timestamp,
+                     'new': new, 'updated': updated, 'cleared': cleared}
+            for subscriber in list(self.subscribers):
+                try:
+                    subscriber.put_nowait(delta)
+                except queue.Full:
+                    # Too far behind to catch up from deltas; it resyncs with
+                    # a fresh snapshot when it reconnects
+                    self.subscribers.discard(subscriber)
+            return delta
+
+    def subscribe(self):
+        subscriber = queue.Queue(self.queue_size)
+        with self.lock:
+            subscriber.put_nowait(self.snapshot_event())
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def is_subscribed(self, subscriber):
+        with self.lock:
+            return subscriber in self.subscribers
+
+
+class AlertHandler(BaseHTTPRequestHandler):
+    # GET <prefix>/conflicts returns the current snapshot of the hub at that
+    # path prefix, GET <prefix>/events is a server-sent event stream of one
+    # snapshot followed by deltas
+    hubs = {}
+
+    def do_GET(self):
+        prefix, _, endpoint = self.path.rpartition('/')
+        hub = self.hubs.get(prefix)
+        if hub is None:
+            self.send_error(404)
+        elif endpoint == 'conflicts':
+            body = json.dumps(hub.snapshot()).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif endpoint == 'events':
+            self.stream_events(hub)
+        else:
+            self.send_error(404)
+
+    def stream_events(self, hub):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+
+        subscriber = hub.subscribe()
+        try:
+            while True:
+                try:
+                    event = subscriber.get(timeout=SERVICE_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    if not hub.is_subscribed(subscriber):
+                        return
+                    self.wfile.write(b': keepalive\n\n')
+                else:
+                    self.wfile.write(f"event: {event['type']}\nid: {event['sequence']}\n"
+                                     f"data: {json.dumps(event)}\n\n".encode())
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            hub.unsubscribe(subscriber)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(hubs, host, port):
+    # hubs maps a path prefix ('' or e.g. '/regions/ZDC') to its AlertHub
+    handler = type('BoundAlertHandler', (AlertHandler,), {'hubs': hubs})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
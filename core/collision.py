@@ -1,6 +1,16 @@
-from config import VERTICAL_TOLERANCE_FT
+from collections import namedtuple
+
+import numpy as np
+
+from config import VERTICAL_TOLERANCE_FT, LATERAL_SEPARATION_RED_NM, VERTICAL_SEPARATION_RED_FT, \
+    LATERAL_SEPARATION_YELLOW_NM, VERTICAL_SEPARATION_YELLOW_FT
 from utils.collision_status import is_red_alert, is_yellow_alert
-from utils.great_circle import haversine_distance
+from utils.great_circle import haversine_distance, haversine_distance_array
+
+# RED and YELLOW minima; facility regions can set their own
+Separation = namedtuple('Separation', ('lateral_red_nm', 'vertical_red_ft', 'lateral_yellow_nm', 'vertical_yellow_ft'))
+DEFAULT_SEPARATION = Separation(LATERAL_SEPARATION_RED_NM, VERTICAL_SEPARATION_RED_FT,
+                                LATERAL_SEPARATION_YELLOW_NM, VERTICAL_SEPARATION_YELLOW_FT)
 
 
 def get_collision_status(pos1, pos2):
@@ -18,10 +28,31 @@ def get_collision_status(pos1, pos2):
         return 0
 
 
+def get_separation_array(pos1, pos2):
+    # (lateral, vertical) distances as get_collision_status measures them
+    lat1, lon1, alt1, dev1 = (np.asarray(c, dtype=float) for c in pos1)
+    lat2, lon2, alt2, dev2 = (np.asarray(c, dtype=float) for c in pos2)
+
+    lateral_distance = haversine_distance_array(lat1, lon1, lat2, lon2) - dev1 - dev2
+    vertical_distance = np.abs(alt1 - alt2) + VERTICAL_TOLERANCE_FT
+    return lateral_distance, vertical_distance
+
+
+def get_status_array(lateral_distance, vertical_distance, separation=DEFAULT_SEPARATION):
+    red = (lateral_distance <= separation.lateral_red_nm) & (vertical_distance <= separation.vertical_red_ft)
+    yellow = (lateral_distance <= separation.lateral_yellow_nm) & (vertical_distance <= separation.vertical_yellow_ft)
+    return np.where(red, 2, np.where(yellow, 1, 0))
+
+
+def pair_key(callsign, other):
+    # Unordered callsign pair
+    return (callsign, other) if callsign < other else (other, callsign)
+
+
 def get_status_text(status):
     if status == 2:
         return "RED"
     elif status == 1:
         return "YELLOW"
 
-    return None
\ No newline at end of file
+    return None
@@ -0,0 +1,225 @@
+import numpy as np
+
+from config import CONFLICT_ENGINE, PREDICTION_PRECISION_MINUTES, PREDICTION_MINUTES_AHEAD, VERTICAL_TOLERANCE_FT, \
+    WAYPOINT_TOLERANCE_NM
+from core.collision import DEFAULT_SEPARATION, get_separation_array, get_status_array
+from core.cpa import analyze_pair
+from core.position_prediction import predict_position_tensor, predict_trajectory
+from utils import metrics
+from utils.great_circle import haversine_distance_array
+from utils.spatial_grid import candidate_pairs, padded_box
+
+
+
+def alert_limits(separation):
+    # Separation below which a pair has some alert status
+    return (max(separation.lateral_red_nm, separation.lateral_yellow_nm),
+            max(separation.vertical_red_ft, separation.vertical_yellow_ft))
+
+
+def broad_phase_cell_nm(separation):
+    # Route deviation is bounded by the on-path tolerance, so a grid cell of
+    # this size always holds both members of a pair that can reach alert
+    # separation
+    return alert_limits(separation)[0] + 2 * WAYPOINT_TOLERANCE_NM
+
+
+def broad_phase_vertical_pad_ft(separation):
+    return (alert_limits(separation)[1] - VERTICAL_TOLERANCE_FT) / 2
+
+
+ALERT_LATERAL_NM, ALERT_VERTICAL_FT = alert_limits(DEFAULT_SEPARATION)
+BROAD_PHASE_CELL_NM = broad_phase_cell_nm(DEFAULT_SEPARATION)
+BROAD_PHASE_VERTICAL_PAD_FT = broad_phase_vertical_pad_ft(DEFAULT_SEPARATION)
+
+
+def step_times():
+    return np.arange(0, PREDICTION_MINUTES_AHEAD + 1e-9, PREDICTION_PRECISION_MINUTES)
+
+
+def skip_minutes(lateral_distance, vertical_distance, closure_nm_per_min, closure_ft_per_min,
+                 separation=DEFAULT_SEPARATION):
+    # Shortest time in which a pair could get within both alert thresholds:
+    # lateral separation closes at most at the sum of the ground speeds and
+    # vertical separation at most at the sum of the vertical speeds
+    alert_lateral, alert_vertical = alert_limits(separation)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lateral = np.where(lateral_distance > alert_lateral,
+                           (lateral_distance - alert_lateral) / closure_nm_per_min, 0.0)
+        vertical = np.where(vertical_distance > alert_vertical,
+                            (vertical_distance - alert_vertical) / closure_ft_per_min, 0.0)
+    return np.nan_to_num(np.maximum(lateral, vertical), nan=0.0)
+
+
+def step_rates(positions, times, ground_speeds, vertical_speeds):
+    # Fastest lateral (NM/min) and vertical (ft/min) movement of each aircraft
+    # between consecutive steps, never below its ground and vertical speed.
+    # The jump from the direct-to leg onto the route can exceed ground speed.
+    elapsed = np.diff(times)
+    lateral = haversine_distance_array(positions[:, :-1, 0], positions[:, :-1, 1],
+                                       positions[:, 1:, 0], positions[:, 1:, 1]) / elapsed
+    vertical = np.abs(np.diff(positions[:, :, 2], axis=1)) / elapsed
+    return (np.fmax(ground_speeds, np.nanmax(lateral, axis=1, initial=0.0)),
+            np.fmax(vertical_speeds, np.nanmax(vertical, axis=1, initial=0.0)))
+
+
+def track_box(track, deviation, separation=DEFAULT_SEPARATION):
+    # Swept box of one aircraft's step positions
+    track = track[~np.isnan(track[:, 0])]
+    if len(track) == 0:
+        return None
+    return padded_box(track[:, 0].tolist(), track[:, 1].tolist(), track[:, 2].tolist(),
+                      alert_limits(separation)[0] / 2 + deviation, broad_phase_vertical_pad_ft(separation))
+
+
+def step_conflicts(table, rows, positions=None, separation=DEFAULT_SEPARATION):
+    times = step_times()
+    if positions is None:
+        positions = predict_position_tensor(table, rows, times)
+    deviations = table.deviation[rows]
+
+    # Pairs whose swept positions or altitude envelopes over the whole
+    # look-ahead never come within alert separation are never stepped
+    boxes = [track_box(track, deviation, separation) for track, deviation in zip(positions, deviations.tolist())]
+    pairs = candidate_pairs(boxes, broad_phase_cell_nm(separation), alert_limits(separation)[1])
+    metrics.count('pairs_evaluated', len(pairs))
+    if not pairs:
+        return []
+
+    first, second = np.array(pairs).T
+    lateral_rates, vertical_rates = step_rates(positions, times, table.ground_speed[rows] / 60,
+                                               np.abs(table.vertical_speed[rows]))
+    closure_nm_per_min = lateral_rates[first] + lateral_rates[second]
+    closure_ft_per_min = vertical_rates[first] + vertical_rates[second]
+
+    # Each pair is only revisited at the first step it could be in conflict
+    next_step = np.zeros(len(pairs), dtype=int)
+    pair_conflicts = []
+    for step, minutes in enumerate(times.tolist()):
+        due = np.flatnonzero(next_step == step)
+        if due.size == 0:
+            continue
+        metrics.count('pair_steps_evaluated', due.size)
+
+        a, b = first[due], second[due]
+        lateral_distance, vertical_distance = get_separation_array(
+            (*positions[a, step].T, deviations[a]),
+            (*positions[b, step].T, deviations[b])
+        )
+        statuses = get_status_array(lateral_distance, vertical_distance, separation)
+        for pair, collision_status in zip(due[statuses > 0].tolist(), statuses[statuses > 0].tolist()):
+            pair_conflicts.append((rows[first[pair]], rows[second[pair]], {
+                'status': collision_status,
+                'time_minutes_ahead': minutes,
+                'cpa_time_minutes_ahead': None,
+                'cpa_distance_nm': None,
+            }))
+
+        skip = skip_minutes(lateral_distance, vertical_distance, closure_nm_per_min[due], closure_ft_per_min[due],
+                            separation)
+        following = np.searchsorted(times, minutes + skip - 1e-9, side='left')
+        next_step[due] = np.where(statuses > 0, len(times), np.maximum(following, step + 1))
+
+    return pair_conflicts
+
+
+def predict_trajectories(table, rows):
+    return [predict_trajectory(table.latitude[i], table.longitude[i], table.altitude[i],
+                               table.vertical_speed[i], table.ground_speed[i], table.remaining_route_coords(i),
+                               table.target_altitude(i), PREDICTION_MINUTES_AHEAD)
+            for i in rows]
+
+
+def trajectory_box(trajectory, deviation, separation=DEFAULT_SEPARATION):
+    if len(trajectory) < 2:
+        return None
+    return padded_box([p[1] for p in trajectory], [p[2] for p in trajectory], [p[3] for p in trajectory],
+                      alert_limits(separation)[0] / 2 + deviation, broad_phase_vertical_pad_ft(separation))
+
+
+def cpa_conflicts(table, rows, trajectories=None, separation=DEFAULT_SEPARATION):
+    if trajectories is None:
+        trajectories = predict_trajectories(table, rows)
+    deviations = table.deviation[rows].tolist()
+    boxes = [trajectory_box(trajectory, deviation, separation) for trajectory, deviation in zip(trajectories, deviations)]
+
+    pairs = candidate_pairs(boxes, broad_phase_cell_nm(separation), alert_limits(separation)[1])
+    metrics.count('pairs_evaluated', len(pairs))
+
+    pair_conflicts = []
+    for a, b in pairs:
+        result = analyze_pair(trajectories[a], trajectories[b], deviations[a] + deviations[b], separation)
+        if result['status'] > 0:
+            pair_conflicts.append((rows[a], rows[b], result))
+
+    return pair_conflicts
+
+
+def collect_conflicts(table, rows, pair_conflicts):
+    # Writes each row's earliest conflicting partner into the table's conflict
+    # columns and returns (conflicting rows, non-conflicting rows). The
+    # mirrored entry of a pair that is already reported is left out.
+    ordered = sorted(pair_conflicts, key=lambda c: (c[2]['time_minutes_ahead'], min(c[0], c[1]), max(c[0], c[1])))
+    for a, b, result in reversed(ordered):
+        for row, partner in ((a, b), (b, a)):
+            table.conflict_status[row] = result['status']
+            table.conflict_partner[row] = partner
+            table.conflict_time[row] = result['time_minutes_ahead']
+            table.conflict_cpa_distance[row] = np.nan if result['cpa_distance_nm'] is None else result['cpa_distance_nm']
+            table.conflict_onset[row] = result.get('onset', np.nan)
+
+    conflicting_rows = []
+    non_conflicting_rows = []
+    reported = set()
+    for row in rows:
+        partner = table.conflict_partner[row]
+        if partner < 0:
+            non_conflicting_rows.append(row)
+            continue
+
+        if (partner, row) in reported:
+            continue
+        reported.add((row, partner))
+        conflicting_rows.append(row)
+
+    return conflicting_rows, non_conflicting_rows
+
+
+def predict(table, rows):
+    # Position tensor for the step engine, trajectories for the CPA engine
+    if CONFLICT_ENGINE == 'step':
+        return predict_position_tensor(table, rows, step_times())
+    return predict_trajectories(table, rows)
+
+
+def predicted_boxes(table, rows, predicted, separation=DEFAULT_SEPARATION):
+    # Broad-phase box of each row's predict() output
+    box = track_box if CONFLICT_ENGINE == 'step' else trajectory_box
+    return [box(path, deviation, separation) for path, deviation in zip(predicted, table.deviation[rows].tolist())]
+
+
+def select_predicted(predicted, indices):
+    # predict() output of the rows at the given indices
+    if CONFLICT_ENGINE == 'step':
+        return predicted[indices]
+    return [predicted[k] for k in indices]
+
+
+def pair_status(table, a, b, paths=None, separation=DEFAULT_SEPARATION):
+    # Alert status of one pair over the look-ahead with the active engine.
+    # paths is the pair's predict() output when detection already has it.
+    if paths is None:
+        paths = predict(table, [a, b])
+    if CONFLICT_ENGINE == 'step':
+        lateral_distance, vertical_distance = get_separation_array((*paths[0].T, table.deviation[a]),
+                                                                   (*paths[1].T, table.deviation[b]))
+        return int(get_status_array(lateral_distance, vertical_distance, separation).max(initial=0))
+    return analyze_pair(paths[0], paths[1], table.deviation[a] + table.deviation[b], separation)['status']
+
+
+def find_conflicts(table, rows, predicted=None, separation=DEFAULT_SEPARATION):
+    # Returns (row, row, result) for every conflicting pair among the rows.
+    # predicted is the output of predict() when it has already been computed.
+    if CONFLICT_ENGINE == 'step':
+        return step_conflicts(table, rows, predicted, separation)
+    return cpa_conflicts(table, rows, predicted, separation)
@@ -0,0 +1,148 @@
+from config import CONFLICT_RAISE_CYCLES, CONFLICT_CLEAR_CYCLES, CONFLICT_CLEAR_MARGIN_NM, CONFLICT_CLEAR_MARGIN_FT
+from core.collision import DEFAULT_SEPARATION, pair_key
+from core.conflict_engine import pair_status, select_predicted
+from utils import metrics
+
+
+def clear_separation(separation):
+    # Minima widened by the clear margins: an alerted pair stays alerted while
+    # it is still predicted inside them
+    return separation._replace(lateral_red_nm=separation.lateral_red_nm + CONFLICT_CLEAR_MARGIN_NM,
+                               vertical_red_ft=separation.vertical_red_ft + CONFLICT_CLEAR_MARGIN_FT,
+                               lateral_yellow_nm=separation.lateral_yellow_nm + CONFLICT_CLEAR_MARGIN_NM,
+                               vertical_yellow_ft=separation.vertical_yellow_ft + CONFLICT_CLEAR_MARGIN_FT)
+
+
+class ConflictRegistry:
+    # Conflicts kept across cycles per unordered callsign pair. Detections of
+    # one cycle go through raise/clear hysteresis before they are alerted, and
+    # each pair keeps its onset, severity history, minimum predicted
+    # separation and its last time to conflict and closest approach.
+    def __init__(self, separation=DEFAULT_SEPARATION):
+        self.clear_separation = clear_separation(separation)
+        # (callsign, callsign) -> pair state
+        self.pairs = {}
+
+    def entry(self, key, now):
+        return {
+            'callsigns': key,
+            'onset': now,
+            'raised': None,
+            'status': 0,
+            'history': [],
+            'detections': 0,
+            'misses': 0,
+            'lower': 0,
+            'time': now,
+            'time_minutes_ahead': None,
+            'cpa_time_minutes_ahead': None,
+            'cpa_distance_nm': None,
+            'min_cpa_distance_nm': None,
+        }
+
+    def detected(self, pair, result, now):
+        if not pair['history'] or pair['history'][-1][1] != result['status']:
+            pair['history'].append((now, result['status']))
+        pair['detections'] += 1
+        pair['misses'] = 0
+        pair['time'] = now
+        pair['time_minutes_ahead'] = result['time_minutes_ahead']
+        pair['cpa_time_minutes_ahead'] = result['cpa_time_minutes_ahead']
+        pair['cpa_distance_nm'] = result['cpa_distance_nm']
+        if result['cpa_distance_nm'] is not None and (pair['min_cpa_distance_nm'] is None
+                                                      or result['cpa_distance_nm'] < pair['min_cpa_distance_nm']):
+            pair['min_cpa_distance_nm'] = result['cpa_distance_nm']
+
+        if pair['raised'] is None:
+            if pair['detections'] >= CONFLICT_RAISE_CYCLES:
+                pair['raised'] = now
+                pair['status'] = result['status']
+                metrics.count('alerts_raised')
+        elif result['status'] >= pair['status']:
+            pair['status'] = result['status']
+            pair['lower'] = 0
+        else:
+            pair['lower'] += 1
+            if pair['lower'] >= CONFLICT_CLEAR_CYCLES:
+                pair['status'] = result['status']
+                pair['lower'] = 0
+
+    def missed(self, table, pair, a, b, paths):
+        # Returns whether a raised pair that was not detected this cycle stays
+        # alerted. The detecting engine re-checks it against the widened minima.
+        metrics.count('alerts_rechecked')
+        if pair_status(table, a, b, paths, self.clear_separation) > 0:
+            pair['misses'] = 0
+        else:
+            pair['misses'] += 1
+        return pair['misses'] < CONFLICT_CLEAR_CYCLES
+
+    def update(self, table, rows, pair_conflicts, now, predicted=None):
+        # Takes this cycle's (row, row, result) detections and returns the
+        # alerted pairs in the same form. `now` is the snapshot time in seconds;
+        # predicted is the predict() output of the rows when detection made one,
+        # so re-checks use the same paths.
+        detections = {}
+        for a, b, result in pair_conflicts:
+            key = pair_key(table.callsigns[a], table.callsigns[b])
+            detections[key] = result
+            pair = self.pairs.get(key)
+            if pair is None:
+                pair = self.pairs[key] = self.entry(key, now)
+            self.detected(pair, result, now)
+
+        probed = {table.callsigns[i]: k for k, i in enumerate(rows)}
+        alerts = []
+        for key, pair in list(self.pairs.items()):
+            ka, kb = probed.get(key[0]), probed.get(key[1])
+            a = None if ka is None else rows[ka]
+            b = None if kb is None else rows[kb]
+            if key not in detections:
+                paths = None if predicted is None or a is None or b is None else select_predicted(predicted, [ka, kb])
+                if pair['raised'] is None or a is None or b is None or not self.missed(table, pair, a, b, paths):
+                    if pair['raised'] is not None:
+                        metrics.count('alerts_cleared')
+                    del self.pairs[key]
+                    continue
+                metrics.count('alerts_held')
+            if pair['raised'] is None:
+                continue
+
+            # Times of a held pair count down from the cycle it was last seen
+            elapsed = (now - pair['time']) / 60
+            alerts.append((a, b, {
+                'status': pair['status'],
+                'time_minutes_ahead': max(0.0, pair['time_minutes_ahead'] - elapsed),
+                'cpa_time_minutes_ahead': None if pair['cpa_time_minutes_ahead'] is None
+                else max(0.0, pair['cpa_time_minutes_ahead'] - elapsed),
+                'cpa_distance_nm': pair['cpa_distance_nm'],
+                'onset': pair['onset'],
+            }))
+
+        metrics.count('conflict_clusters', len(self.clusters()))
+        return alerts
+
+    def clusters(self):
+        # Callsign sets connected through alerted pairs
+        neighbors = {}
+        for (callsign, other), pair in self.pairs.items():
+            if pair['raised'] is not None:
+                neighbors.setdefault(callsign, set()).add(other)
+                neighbors.setdefault(other, set()).add(callsign)
+
+        clusters = []
+        seen = set()
+        for callsign in neighbors:
+            if callsign in seen:
+                continue
+            cluster = set()
+            stack = [callsign]
+            while stack:
+                member = stack.pop()
+                if member in cluster:
+                    continue
+                cluster.add(member)
+                stack.extend(neighbors[member] - cluster)
+            seen |= cluster
+            clusters.append(cluster)
+        return clusters
@@ -0,0 +1,169 @@
+import math
+
+from config import VERTICAL_TOLERANCE_FT
+from core.collision import DEFAULT_SEPARATION
+
+NM_PER_DEG_LAT = 60.0
+
+
+def position_at(trajectory, index, t):
+    t0, lat0, lon0, alt0 = trajectory[index]
+    t1, lat1, lon1, alt1 = trajectory[index + 1]
+    f = (t - t0) / (t1 - t0) if t1 > t0 else 0.0
+    return lat0 + f * (lat1 - lat0), lon0 + f * (lon1 - lon0), alt0 + f * (alt1 - alt0)
+
+
+def paired_intervals(traj1, traj2):
+    # Yields (t_start, t_end, pos1_start, pos1_end, pos2_start, pos2_end) over
+    # the common time span, split at every breakpoint of either trajectory so
+    # that both aircraft move linearly inside each interval
+    if len(traj1) < 2 or len(traj2) < 2:
+        return
+
+    end = min(traj1[-1][0], traj2[-1][0])
+    i = j = 0
+    t = 0.0
+    while t < end:
+        while traj1[i + 1][0] <= t:
+            i += 1
+        while traj2[j + 1][0] <= t:
+            j += 1
+        t_next = min(traj1[i + 1][0], traj2[j + 1][0], end)
+        yield (t, t_next,
+               position_at(traj1, i, t), position_at(traj1, i, t_next),
+               position_at(traj2, j, t), position_at(traj2, j, t_next))
+        t = t_next
+
+
+def relative_motion(t0, t1, p1a, p1b, p2a, p2b):
+    # Relative position (NM, ft) at t0 and velocity (per minute) of aircraft 1
+    # with respect to aircraft 2 in a local tangent plane centred on the pair
+    lat_ref = math.radians((p1a[0] + p1b[0] + p2a[0] + p2b[0]) / 4)
+    nm_per_deg_lon = NM_PER_DEG_LAT * math.cos(lat_ref)
+
+    rx0 = (p1a[1] - p2a[1]) * nm_per_deg_lon
+    ry0 = (p1a[0] - p2a[0]) * NM_PER_DEG_LAT
+    rz0 = p1a[2] - p2a[2]
+    rx1 = (p1b[1] - p2b[1]) * nm_per_deg_lon
+    ry1 = (p1b[0] - p2b[0]) * NM_PER_DEG_LAT
+    rz1 = p1b[2] - p2b[2]
+
+    dt = t1 - t0
+    return (rx0, ry0, rz0), ((rx1 - rx0) / dt, (ry1 - ry0) / dt, (rz1 - rz0) / dt)
+
+
+def lateral_window(r, v, duration, radius):
+    # Sub-interval of [0, duration] where |r + v*t| <= radius
+    a = v[0] * v[0] + v[1] * v[1]
+    b = 2 * (r[0] * v[0] + r[1] * v[1])
+    c = r[0] * r[0] + r[1] * r[1] - radius * radius
+    if a < 1e-12:
+        return (0.0, duration) if c <= 0 else None
+
+    disc = b * b - 4 * a * c
+    if disc < 0:
+        return None
+    sq = math.sqrt(disc)
+    lo = max(0.0, (-b - sq) / (2 * a))
+    hi = min(duration, (-b + sq) / (2 * a))
+    return (lo, hi) if lo <= hi else None
+
+
+def vertical_window(rz, vz, duration, limit):
+    # Sub-interval of [0, duration] where |rz + vz*t| <= limit
+    if abs(vz) < 1e-9:
+        return (0.0, duration) if abs(rz) <= limit else None
+
+    t_a = (-limit - rz) / vz
+    t_b = (limit - rz) / vz
+    lo = max(0.0, min(t_a, t_b))
+    hi = min(duration, max(t_a, t_b))
+    return (lo, hi) if lo <= hi else None
+
+
+def first_loss_in_interval(r, v, duration, lateral_nm, vertical_ft):
+    lateral = lateral_window(r, v, duration, lateral_nm)
+    if lateral is None:
+        return None
+    vertical = vertical_window(r[2], v[2], duration, vertical_ft)
+    if vertical is None:
+        return None
+
+    lo = max(lateral[0], vertical[0])
+    hi = min(lateral[1], vertical[1])
+    return lo if lo <= hi else None
+
+
+def closest_approach_in_interval(r, v, duration):
+    a = v[0] * v[0] + v[1] * v[1]
+    t = 0.0 if a < 1e-12 else min(duration, max(0.0, -(r[0] * v[0] + r[1] * v[1]) / a))
+    return t, math.hypot(r[0] + v[0] * t, r[1] + v[1] * t)
+
+
+def relative_intervals(traj1, traj2):
+    # (t_start, t_end, r, v) per common linear interval of the pair; enough to
+    # evaluate the pair over any time window without re-interpolating
+    intervals = []
+    for t0, t1, p1a, p1b, p2a, p2b in paired_intervals(traj1, traj2):
+        if t1 - t0 <= 0:
+            continue
+        r, v = relative_motion(t0, t1, p1a, p1b, p2a, p2b)
+        intervals.append((t0, t1, r, v))
+    return intervals
+
+
+def evaluate_intervals(intervals, deviation_nm, start=0.0, end=math.inf, separation=DEFAULT_SEPARATION):
+    # Exact first loss of RED and YELLOW separation plus the lateral closest
+    # point of approach within [start, end], with times relative to start.
+    # Route deviation widens the lateral thresholds and the vertical tolerance
+    # narrows the vertical ones, as in get_collision_status.
+    red_lateral = separation.lateral_red_nm + deviation_nm
+    red_vertical = separation.vertical_red_ft - VERTICAL_TOLERANCE_FT
+    yellow_lateral = separation.lateral_yellow_nm + deviation_nm
+    yellow_vertical = separation.vertical_yellow_ft - VERTICAL_TOLERANCE_FT
+
+    red_time = None
+    yellow_time = None
+    cpa_time = None
+    cpa_distance = None
+    for t0, t1, r, v in intervals:
+        if t1 <= start or t0 >= end:
+            continue
+        if t0 < start:
+            shift = start - t0
+            r = (r[0] + v[0] * shift, r[1] + v[1] * shift, r[2] + v[2] * shift)
+            t0 = start
+        duration = min(t1, end) - t0
+        if duration <= 0:
+            continue
+
+        t, distance = closest_approach_in_interval(r, v, duration)
+        if cpa_distance is None or distance < cpa_distance:
+            cpa_time, cpa_distance = t0 + t - start, distance
+
+        if yellow_time is None:
+            t = first_loss_in_interval(r, v, duration, yellow_lateral, yellow_vertical)
+            if t is not None:
+                yellow_time = t0 + t - start
+        if red_time is None and yellow_time is not None:
+            t = first_loss_in_interval(r, v, duration, red_lateral, red_vertical)
+            if t is not None:
+                red_time = t0 + t - start
+
+    if red_time is not None:
+        status, time = 2, red_time
+    elif yellow_time is not None:
+        status, time = 1, yellow_time
+    else:
+        status, time = 0, None
+
+    return {
+        'status': status,
+        'time_minutes_ahead': time,
+        'cpa_time_minutes_ahead': cpa_time,
+        'cpa_distance_nm': cpa_distance,
+    }
+
+
+def analyze_pair(traj1, traj2, deviation_nm, separation=DEFAULT_SEPARATION):
+    return evaluate_intervals(relative_intervals(traj1, traj2), deviation_nm, separation=separation)
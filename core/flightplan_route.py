@@ -1,30 +1,152 @@
-from utils.faa import deconstruct_awy, get_lat_lon
+import re
+from collections import namedtuple
 
+import numpy as np
 
-def route_to_lat_lon(route_str):
-    waypoints = route_str.split(' ')
-    waypoints = [wp.split('/')[0] for wp in waypoints if wp != 'DCT' and wp != '']
-
-    coordinates = []
-    for waypoint in waypoints:
-        if is_airway_regex(waypoint):
-            from_fix = waypoints[waypoints.index(waypoint) - 1] if waypoints.index(waypoint) > 0 else None
-            to_fix = waypoints[waypoints.index(waypoint) + 1] if waypoints.index(waypoint) < len(
-                waypoints) - 1 else None
-            airway_points = deconstruct_awy(waypoint, from_fix, to_fix)
-            for awy_wp in airway_points:
-                awy_wp_coords = get_lat_lon(awy_wp)
-                if awy_wp_coords:
-                    coordinates.append((awy_wp, awy_wp_coords))
+import utils.faa as faa
+from config import ROUTE_CACHE_SIZE, ROUTE_CACHE_TTL_SECONDS
+from core.route_segment import build_route_geometry
+from utils.lru_cache import LRUCache
+
+route_cache = LRUCache(ROUTE_CACHE_SIZE, ROUTE_CACHE_TTL_SECONDS)
+route_cache_navdata_version = faa.navdata_version
+
+
+AIRWAY_PATTERN = re.compile(r"^[JVQT]\d{1,3}$")
+# ICAO speed/level: N0450 (kt), K0830 (km/h) or M082 (Mach), then F350 / A045
+# (hundreds of feet) or S1130 / M0840 (tens of metres)
+SPEED_LEVEL_PATTERN = re.compile(r"^(?:[NK]\d{4}|M\d{3})(?:([FA])(\d{3})|([SM])(\d{4}))$")
+FT_PER_M = 3.28084
+
+RouteToken = namedtuple('RouteToken', ('name', 'kind', 'altitude_ft'))
+
+
+def parse_level(text):
+    # Feet of the level in an ICAO speed/level group, or None. The filed speed
+    # is not kept: prediction flies the measured ground speed.
+    match = SPEED_LEVEL_PATTERN.match(text)
+    if match is None:
+        return None
 
+    _, level, _, metric_level = match.groups()
+    return int(level) * 100 if level is not None else int(metric_level) * 10 * FT_PER_M
+
+
+def classify_token(name):
+    # How a point is resolved: airway expansion, fix/radial/distance, lat/lon
+    # literal, or a navdata lookup for fixes, navaids, airports and procedures
+    if AIRWAY_PATTERN.match(name):
+        return 'airway'
+    elif faa.FRD_PATTERN.match(name):
+        return 'frd'
+    elif faa.LAT_LON_PATTERN.match(name):
+        return 'latlon'
+    return 'point'
+
+
+def tokenize_route(route_str):
+    # One pass over the route string. DCT is dropped; a /speed-level suffix, or
+    # a standalone speed/level group, is kept on the point it follows.
+    tokens = []
+    for text in route_str.split(' '):
+        if text == 'DCT' or text == '':
             continue
 
-        waypoint_coordinates = get_lat_lon(waypoint)
-        if waypoint_coordinates:
-            coordinates.append((waypoint, waypoint_coordinates))
+        name, _, suffix = text.partition('/')
+        altitude_ft = parse_level(suffix) if suffix else None
+        if altitude_ft is None and not suffix:
+            altitude_ft = parse_level(name)
+            if altitude_ft is not None:
+                if tokens:
+                    tokens[-1] = tokens[-1]._replace(altitude_ft=altitude_ft)
+                continue
+
+        tokens.append(RouteToken(name, classify_token(name), altitude_ft))
+    return tokens
+
+
+def expand_route(route_str):
+    # [(name, coords, altitude_ft)] for every resolvable point. Airway fixes
+    # come pre-resolved from the airway graph, FRD points and lat/lon literals
+    # are computed, and navdata points are looked up in one batch afterwards.
+    tokens = tokenize_route(route_str)
+    points = []
+    unresolved = []
+    for i, token in enumerate(tokens):
+        if token.kind == 'airway':
+            from_fix = tokens[i - 1].name if i > 0 else None
+            to_fix = tokens[i + 1].name if i < len(tokens) - 1 else None
+            if token.altitude_ft is not None and points:
+                # A level filed on the airway itself takes effect at its entry fix
+                points[-1] = (points[-1][0], points[-1][1], token.altitude_ft)
+            points.extend((fix_id, coords, None) for fix_id, coords in faa.airways.segment(token.name, from_fix, to_fix))
+        elif token.kind == 'frd':
+            points.append((token.name, faa.frd_lat_lon(token.name), token.altitude_ft))
+        elif token.kind == 'latlon':
+            points.append((token.name, faa.parse_lat_lon(token.name), token.altitude_ft))
+        else:
+            unresolved.append(len(points))
+            points.append((token.name, None, token.altitude_ft))
+
+    coordinates = faa.resolver.resolve_many([points[i][0] for i in unresolved])
+    for i, coords in zip(unresolved, coordinates):
+        points[i] = (points[i][0], coords, points[i][2])
+
+    # A level filed on a point that does not resolve takes effect at the next
+    # one that does, unless that point files its own
+    resolved = []
+    carried = None
+    for name, coords, altitude_ft in points:
+        if not coords:
+            if altitude_ft is not None:
+                carried = altitude_ft
+            continue
+        resolved.append((name, coords, carried if altitude_ft is None else altitude_ft))
+        carried = None
+    return resolved
+
+
+def route_to_lat_lon(route_str):
+    return [(name, coords) for name, coords, _ in expand_route(route_str)]
+
+
+def in_effect(values):
+    # Each point's most recently filed value at or before it, NaN before the first
+    values = np.array([np.nan if value is None else value for value in values], dtype=float)
+    filed = np.where(np.isnan(values), -1, np.arange(len(values)))
+    latest = np.maximum.accumulate(filed) if len(values) else filed
+    return np.where(latest >= 0, values[np.maximum(latest, 0)], np.nan)
+
+def normalize_route(departure, route, arrival):
+    return ' '.join(f"{departure or ''} {route or ''} {arrival or ''}".upper().split())
+
+def get_route(departure, route, arrival):
+    # Expanded routes are shared between polls and between flights filing the
+    # same route; the returned entry must not be mutated
+    global route_cache_navdata_version
+
+    if route_cache_navdata_version != faa.navdata_version:
+        route_cache.clear()
+        route_cache_navdata_version = faa.navdata_version
+
+    key = normalize_route(departure, route, arrival)
+    entry = route_cache.get(key)
+    if entry is None:
+        points = expand_route(key)
+        coordinates = [(name, coords) for name, coords, _ in points]
+        entry = {
+            'waypoints': coordinates,
+            'coords': np.array([coords for _, coords in coordinates], dtype=float).reshape(-1, 2),
+            'geometry': build_route_geometry(coordinates),
+            # Level filed in the route, in effect from each waypoint on
+            'levels': in_effect([altitude_ft for _, _, altitude_ft in points]),
+        }
+        route_cache.put(key, entry)
+
+    return entry
 
-    return coordinates
+def route_cache_stats():
+    return route_cache.stats()
 
 def is_airway_regex(str):
-    import re
-    return bool(re.match(r"^[JVQT]\d{1,3}$", str))
\ No newline at end of file
+    return bool(AIRWAY_PATTERN.match(str))
@@ -0,0 +1,156 @@
+from config import PREDICTION_MINUTES_AHEAD, VERTICAL_SEPARATION_YELLOW_FT, \
+    INCREMENTAL_MAX_AGE_MINUTES, INCREMENTAL_POSITION_TOLERANCE_NM, \
+    INCREMENTAL_ALTITUDE_TOLERANCE_FT, INCREMENTAL_SPEED_TOLERANCE_KT, INCREMENTAL_TRACK_TOLERANCE_DEG, \
+    INCREMENTAL_VS_TOLERANCE_FPM, INCREMENTAL_DEVIATION_TOLERANCE_NM
+from core.collision import pair_key
+from core.conflict_engine import BROAD_PHASE_CELL_NM, trajectory_box
+from core.cpa import evaluate_intervals, relative_intervals
+from core.flightplan_route import normalize_route
+from core.position_prediction import interpolate_trajectory, predict_trajectory, shift_trajectory
+from core.regions import FEED_BOTTOM_LEFT, FEED_TOP_RIGHT
+import utils.faa as faa
+from utils import metrics
+from utils.great_circle import haversine_distance
+from utils.spatial_grid import SpatialGrid
+
+
+class IncrementalProbe:
+    # CPA probing that keeps trajectories, broad-phase boxes and pair geometry
+    # across cycles. Trajectories are predicted INCREMENTAL_MAX_AGE_MINUTES
+    # past the look-ahead so they stay usable while an aircraft is clean; only
+    # dirty aircraft are re-predicted and only pairs involving them are
+    # re-interpolated. Cached pairs are re-evaluated over the sliding window.
+    def __init__(self):
+        self.grid = SpatialGrid(BROAD_PHASE_CELL_NM, VERTICAL_SEPARATION_YELLOW_FT,
+                                max(abs(FEED_BOTTOM_LEFT[0]), abs(FEED_TOP_RIGHT[0])) + 5)
+        # callsign -> state of the last prediction
+        self.aircraft = {}
+        # callsign -> callsigns whose boxes overlap
+        self.neighbors = {}
+        # (callsign, callsign) -> relative motion of the pair
+        self.pairs = {}
+        self.dirty_count = 0
+        self.pair_recompute_count = 0
+
+    def is_dirty(self, table, i, state, now):
+        elapsed = (now - state['time']) / 60
+        if elapsed < 0 or elapsed > INCREMENTAL_MAX_AGE_MINUTES:
+            return True
+
+        if state['navdata_version'] != faa.navdata_version \
+                or state['route_key'] != normalize_route(table.departures[i], table.routes[i], table.arrivals[i]) \
+                or state['target_altitude'] != table.target_altitude_at(i) \
+                or state['leg'] != table.leg[i]:
+            return True
+
+        if abs(state['ground_speed'] - table.ground_speed[i]) > INCREMENTAL_SPEED_TOLERANCE_KT \
+                or abs((state['heading'] - table.heading[i] + 180) % 360 - 180) > INCREMENTAL_TRACK_TOLERANCE_DEG \
+                or abs(state['vertical_speed'] - table.vertical_speed[i]) > INCREMENTAL_VS_TOLERANCE_FPM \
+                or abs(state['deviation'] - table.deviation[i]) > INCREMENTAL_DEVIATION_TOLERANCE_NM:
+            return True
+
+        # The aircraft must still be where its stored trajectory put it
+        expected = interpolate_trajectory(state['trajectory'], elapsed)
+        if expected is None:
+            return True
+        _, lat, lon, alt = expected
+        return haversine_distance(lat, lon, table.latitude[i], table.longitude[i]) > INCREMENTAL_POSITION_TOLERANCE_NM \
+            or abs(alt - table.altitude[i]) > INCREMENTAL_ALTITUDE_TOLERANCE_FT
+
+    def predict(self, table, i, now):
+        trajectory = predict_trajectory(table.latitude[i], table.longitude[i], table.altitude[i],
+                                        table.vertical_speed[i], table.ground_speed[i],
+                                        table.remaining_route_coords(i), table.target_altitude(i),
+                                        PREDICTION_MINUTES_AHEAD + INCREMENTAL_MAX_AGE_MINUTES)
+        previous = self.aircraft.get(table.callsigns[i])
+        return {
+            'time': now,
+            'version': previous['version'] + 1 if previous else 0,
+            'trajectory': trajectory,
+            'navdata_version': faa.navdata_version,
+            'route_key': normalize_route(table.departures[i], table.routes[i], table.arrivals[i]),
+            'target_altitude': table.target_altitude_at(i),
+            'leg': int(table.leg[i]),
+            'ground_speed': float(table.ground_speed[i]),
+            'heading': float(table.heading[i]),
+            'vertical_speed': float(table.vertical_speed[i]),
+            'deviation': float(table.deviation[i]),
+        }
+
+    def forget(self, callsign):
+        self.aircraft.pop(callsign, None)
+        self.grid.remove(callsign)
+        for other in self.neighbors.pop(callsign, ()):
+            self.neighbors[other].discard(callsign)
+            self.pairs.pop(pair_key(callsign, other), None)
+
+    def update(self, table, rows, now):
+        # Returns (row, row, result) for every conflicting pair among the rows,
+        # like find_conflicts. `now` is the snapshot time in seconds.
+        current = {table.callsigns[i]: i for i in rows}
+        for callsign in [callsign for callsign in self.aircraft if callsign not in current]:
+            self.forget(callsign)
+
+        dirty = []
+        with metrics.timer('prediction'):
+            for callsign, i in current.items():
+                state = self.aircraft.get(callsign)
+                if state is None or self.is_dirty(table, i, state, now):
+                    dirty.append(callsign)
+                    state = self.predict(table, i, now)
+                    self.aircraft[callsign] = state
+                    self.refresh_neighbors(callsign, trajectory_box(state['trajectory'], state['deviation']))
+        self.dirty_count = len(dirty)
+
+        pair_conflicts = []
+        self.pair_recompute_count = 0
+        with metrics.timer('pairs'):
+            for callsign, neighbors in self.neighbors.items():
+                for other in neighbors:
+                    if other < callsign:
+                        continue
+                    result = self.evaluate_pair(callsign, other, now, table.deviation[current[callsign]] +
+                                                table.deviation[current[other]])
+                    if result['status'] > 0:
+                        pair_conflicts.append((current[callsign], current[other], result))
+
+        metrics.count('dirty_aircraft', self.dirty_count)
+        metrics.count('pairs_evaluated', self.pair_recompute_count)
+        return pair_conflicts
+
+    def refresh_neighbors(self, callsign, box):
+        for other in self.neighbors.pop(callsign, ()):
+            self.neighbors[other].discard(callsign)
+            self.pairs.pop(pair_key(callsign, other), None)
+
+        if box is None:
+            self.grid.remove(callsign)
+            self.neighbors[callsign] = set()
+            return
+
+        neighbors = self.grid.insert(callsign, box)
+        self.neighbors[callsign] = neighbors
+        for other in neighbors:
+            self.neighbors[other].add(callsign)
+
+    def evaluate_pair(self, callsign, other, now, deviation):
+        state = self.aircraft[callsign]
+        other_state = self.aircraft[other]
+        key = pair_key(callsign, other)
+        versions = (state['version'], other_state['version'])
+
+        cached = self.pairs.get(key)
+        if cached is None or cached['versions'] != versions:
+            self.pair_recompute_count += 1
+            horizon = PREDICTION_MINUTES_AHEAD + INCREMENTAL_MAX_AGE_MINUTES
+            cached = {
+                'time': now,
+                'versions': versions,
+                'intervals': relative_intervals(
+                    shift_trajectory(state['trajectory'], (now - state['time']) / 60, horizon),
+                    shift_trajectory(other_state['trajectory'], (now - other_state['time']) / 60, horizon)),
+            }
+            self.pairs[key] = cached
+
+        start = (now - cached['time']) / 60
+        return evaluate_intervals(cached['intervals'], deviation, start, start + PREDICTION_MINUTES_AHEAD)
@@ -0,0 +1,128 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from config import PREDICTION_MINUTES_AHEAD, LATERAL_SEPARATION_YELLOW_NM, VERTICAL_SEPARATION_YELLOW_FT, \
+    WAYPOINT_TOLERANCE_NM, PARALLEL_TILE_DEG, PARALLEL_WORKERS
+from core.conflict_engine import BROAD_PHASE_CELL_NM, predict_trajectories, trajectory_box
+from core.cpa import analyze_pair
+from utils import metrics
+from utils.spatial_grid import candidate_pairs
+
+executor = None
+
+
+def get_executor():
+    global executor
+    if executor is None:
+        executor = ProcessPoolExecutor(max_workers=PARALLEL_WORKERS or os.cpu_count())
+    return executor
+
+
+def share_trajectories(trajectories, deviations):
+    # One shared block holding every trajectory point (K x 4), the per-row
+    # offsets into it and the route deviations
+    counts = [len(trajectory) for trajectory in trajectories]
+    offsets = np.concatenate(([0], np.cumsum(counts, dtype=np.int64)))
+    n = len(trajectories)
+    k = int(offsets[-1])
+
+    block = shared_memory.SharedMemory(create=True, size=max(1, (k * 4 + 2 * n + 1) * 8))
+    points, offsets_view, deviations_view = shared_views(block, n, k)
+    if k:
+        points[:] = [point for trajectory in trajectories for point in trajectory]
+    offsets_view[:] = offsets
+    deviations_view[:] = deviations
+    return block, n, k
+
+
+def shared_views(block, n, k):
+    points = np.ndarray((k, 4), dtype=np.float64, buffer=block.buf)
+    offsets = np.ndarray((n + 1,), dtype=np.int64, buffer=block.buf, offset=k * 4 * 8)
+    deviations = np.ndarray((n,), dtype=np.float64, buffer=block.buf, offset=(k * 4 + n + 1) * 8)
+    return points, offsets, deviations
+
+
+def evaluate_tile(block_name, n, k, members, core):
+    # Runs in a worker: pairs among the tile's members that involve at least
+    # one aircraft whose current position lies inside the tile
+    block = shared_memory.SharedMemory(name=block_name)
+    try:
+        points, offsets, deviations = shared_views(block, n, k)
+        trajectories = [list(map(tuple, points[offsets[m]:offsets[m + 1]].tolist())) for m in members]
+        member_deviations = deviations[members].tolist()
+        del points, offsets, deviations
+    finally:
+        block.close()
+
+    core = set(core)
+    boxes = [trajectory_box(trajectory, deviation) for trajectory, deviation in zip(trajectories, member_deviations)]
+    results = []
+    evaluated = 0
+    for a, b in candidate_pairs(boxes, BROAD_PHASE_CELL_NM, VERTICAL_SEPARATION_YELLOW_FT):
+        if members[a] not in core and members[b] not in core:
+            continue
+        evaluated += 1
+        result = analyze_pair(trajectories[a], trajectories[b], member_deviations[a] + member_deviations[b])
+        if result['status'] > 0:
+            results.append((members[a], members[b], result))
+    return evaluated, results
+
+
+def partition_tiles(lats, lons, ground_speeds):
+    # Tiles of PARALLEL_TILE_DEG on a side, each extended by the YELLOW
+    # threshold, both aircraft's route deviation and both aircraft's maximum
+    # travel over the look-ahead, so every pair that can conflict lies
+    # together in the extended tile of each member's home tile
+    max_travel_nm = float(np.nanmax(ground_speeds, initial=0.0)) * PREDICTION_MINUTES_AHEAD / 60
+    margin_nm = LATERAL_SEPARATION_YELLOW_NM + 2 * WAYPOINT_TOLERANCE_NM + 2 * max_travel_nm
+    lat_margin = margin_nm / 60
+    max_abs_lat = min(89.0, float(np.max(np.abs(lats))) + lat_margin)
+    lon_margin = margin_nm / (60 * math.cos(math.radians(max_abs_lat)))
+
+    home_rows = np.floor(lats / PARALLEL_TILE_DEG).astype(int)
+    home_cols = np.floor(lons / PARALLEL_TILE_DEG).astype(int)
+
+    tiles = {}
+    for index, tile in enumerate(zip(home_rows.tolist(), home_cols.tolist())):
+        tiles.setdefault(tile, ([], []))[1].append(index)
+
+    for (row, col), (members, core) in tiles.items():
+        inside = ((lats >= row * PARALLEL_TILE_DEG - lat_margin) & (lats < (row + 1) * PARALLEL_TILE_DEG + lat_margin) &
+                  (lons >= col * PARALLEL_TILE_DEG - lon_margin) & (lons < (col + 1) * PARALLEL_TILE_DEG + lon_margin))
+        members.extend(np.flatnonzero(inside).tolist())
+
+    return list(tiles.values())
+
+
+def parallel_cpa_conflicts(table, rows):
+    # Same results as cpa_conflicts, with the pair stage sharded over a
+    # process pool. Trajectories are predicted here and handed to the workers
+    # through shared memory, so workers need neither navdata nor routes.
+    if not rows:
+        return []
+
+    with metrics.timer('prediction'):
+        trajectories = predict_trajectories(table, rows)
+    deviations = table.deviation[rows]
+    tiles = partition_tiles(table.latitude[rows], table.longitude[rows], table.ground_speed[rows])
+    metrics.count('parallel_tiles', len(tiles))
+
+    with metrics.timer('pairs'):
+        block, n, k = share_trajectories(trajectories, deviations)
+        try:
+            futures = [get_executor().submit(evaluate_tile, block.name, n, k, members, core) for members, core in tiles]
+            merged = {}
+            for future in futures:
+                evaluated, results = future.result()
+                metrics.count('pairs_evaluated', evaluated)
+                for a, b, result in results:
+                    merged[(a, b)] = result
+        finally:
+            block.close()
+            block.unlink()
+
+    return [(rows[a], rows[b], merged[(a, b)]) for a, b in sorted(merged)]
@@ -1,48 +1,172 @@
 import numpy as np
 
 from config import VS_ZERO_RANGE
-from utils.great_circle import great_circle_destination, haversine_distance
+from utils.great_circle import great_circle_destination_array, haversine_distance, haversine_distance_array
 
 def track_between_points(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = np.radians(lat1), np.radians(lon1), np.radians(lat2), np.radians(lon2)
     return np.degrees(np.arctan2(np.sin(lon2 - lon1) * np.cos(lat2), np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(lon2 - lon1)))
 
-def predict_lat_long_alt(lat, long, alt, vs, gs, trk, next_waypoint, waypoints, crz, mins):
+def normalize_vertical_speed(vs):
+    if VS_ZERO_RANGE[0] <= vs <= VS_ZERO_RANGE[1]:
+        return 0
+    return vs
+
+def predict_altitude(alt, vs, crz, mins):
+    pred_alt = alt + (vs * np.asarray(mins, dtype=float))
+
+    if crz is not None and not np.isnan(crz):
+        if vs < 0:
+            pred_alt = np.maximum(pred_alt, crz)
+        elif vs > 0:
+            pred_alt = np.minimum(pred_alt, crz)
+
+    return pred_alt
+
+def route_profile(lat, long, coords):
+    # Along-route distance table over the (lat, lon) route coordinates from the
+    # next waypoint onwards, built once per aircraft and shared by every
+    # look-ahead time
+    if len(coords) == 0:
+        return None
+
+    lats = coords[:, 0]
+    lons = coords[:, 1]
+    return {
+        'lats': lats,
+        'lons': lons,
+        'to_next_nm': haversine_distance(lat, long, lats[0], lons[0]),
+        'cumulative_nm': np.cumsum(haversine_distance_array(lats[:-1], lons[:-1], lats[1:], lons[1:])),
+        'bearings': track_between_points(lats[:-1], lons[:-1], lats[1:], lons[1:]),
+    }
+
+def predict_positions(profile, lat, long, alt, vs, gs, trk, crz, times):
+    # (len(times), 3) array of lat/lon/alt; rows are NaN once the route has ended
+    times = np.asarray(times, dtype=float)
+    positions = np.full((len(times), 3), np.nan)
+    if profile is None:
+        return positions
+
+    vs = normalize_vertical_speed(vs)
+    positions[:, 2] = predict_altitude(alt, vs, crz, times)
+
+    covered = (gs * times) / 60
+    remaining = covered - profile['to_next_nm']
+
+    before_next = remaining < 0
+    if np.any(before_next):
+        p_lat, p_lon = great_circle_destination_array(lat, long, trk, covered[before_next])
+        positions[before_next, 0] = p_lat
+        positions[before_next, 1] = p_lon
+
+    cumulative = profile['cumulative_nm']
+    after_next = ~before_next
+    if cumulative.size > 0 and np.any(after_next):
+        legs = np.searchsorted(cumulative, remaining[after_next], side='right')
+        on_route = legs < cumulative.size
+        if np.any(on_route):
+            rows = np.flatnonzero(after_next)[on_route]
+            legs = legs[on_route]
+            leg_start = np.where(legs > 0, cumulative[legs - 1], 0.0)
+            p_lat, p_lon = great_circle_destination_array(profile['lats'][legs], profile['lons'][legs],
+                                                          profile['bearings'][legs], remaining[rows] - leg_start)
+            positions[rows, 0] = p_lat
+            positions[rows, 1] = p_lon
+
+        at_end = np.flatnonzero(after_next)[~on_route]
+        at_end = at_end[remaining[at_end] == cumulative[-1]]
+        positions[at_end, 0] = profile['lats'][-1]
+        positions[at_end, 1] = profile['lons'][-1]
+
+    positions[np.isnan(positions[:, 0]), 2] = np.nan
+    return positions
+
+def predict_position_tensor(table, rows, times):
+    # (row, time, lat/lon/alt) look-ahead positions for the given table rows
+    positions = np.full((len(rows), len(times), 3), np.nan)
+    for k, i in enumerate(rows):
+        profile = route_profile(table.latitude[i], table.longitude[i], table.remaining_route_coords(i))
+        positions[k] = predict_positions(profile, table.latitude[i], table.longitude[i], table.altitude[i],
+                                         table.vertical_speed[i], table.ground_speed[i], table.heading[i],
+                                         table.target_altitude(i), times)
+    return positions
+
+def waypoint_coords(next_waypoint, waypoints):
     next_waypoints = waypoints[waypoints.index(next_waypoint):]
+    return np.array([wp[1] for wp in next_waypoints], dtype=float).reshape(-1, 2)
 
-    if not next_waypoints:
+def predict_lat_long_alt(lat, long, alt, vs, gs, trk, next_waypoint, waypoints, crz, mins):
+    profile = route_profile(lat, long, waypoint_coords(next_waypoint, waypoints))
+    pred_lat, pred_long, pred_alt = predict_positions(profile, lat, long, alt, vs, gs, trk, crz, [mins])[0]
+
+    if np.isnan(pred_lat):
         return None, None, None
 
-    if VS_ZERO_RANGE[0] <= vs <= VS_ZERO_RANGE[1]:
-        vs = 0
+    return float(pred_lat), float(pred_long), float(pred_alt)
+
+def predict_trajectory(lat, long, alt, vs, gs, coords, crz, mins):
+    # Piecewise-linear path as (minutes ahead, lat, lon, alt) breakpoints: the
+    # aircraft flies direct to the next waypoint and then along the route,
+    # with an extra breakpoint where it levels off at cruise altitude. The path
+    # stops early if the route ends before `mins`.
+    profile = route_profile(lat, long, coords)
+
+    if profile is None or not gs > 0:
+        return []
+
+    vs = normalize_vertical_speed(vs)
 
-    pred_alt = alt + (vs * mins)
+    lats = np.concatenate(([lat], profile['lats']))
+    lons = np.concatenate(([long], profile['lons']))
+    times = np.concatenate(([0.0], profile['to_next_nm'] + np.concatenate(([0.0], profile['cumulative_nm'])))) / gs * 60
 
-    if crz is not None and isinstance(crz, int):
-        if (vs < 0 and pred_alt < crz) or (vs > 0 and pred_alt > crz):
-            pred_alt = crz
+    # Drop zero-length legs and cut the path at the look-ahead horizon
+    keep = np.concatenate(([True], np.diff(times) > 0))
+    lats, lons, times = lats[keep], lons[keep], times[keep]
+    end = np.searchsorted(times, mins, side='left')
+    if end < len(times):
+        f = (mins - times[end - 1]) / (times[end] - times[end - 1])
+        lats = np.append(lats[:end], lats[end - 1] + f * (lats[end] - lats[end - 1]))
+        lons = np.append(lons[:end], lons[end - 1] + f * (lons[end] - lons[end - 1]))
+        times = np.append(times[:end], float(mins))
 
-    pred_distance_covered = (gs * mins) / 60
+    if vs != 0 and crz is not None and not np.isnan(crz):
+        level_off = (crz - alt) / vs
+        if 0 < level_off < times[-1]:
+            i = np.searchsorted(times, level_off)
+            if times[i] != level_off:
+                f = (level_off - times[i - 1]) / (times[i] - times[i - 1])
+                lats = np.insert(lats, i, lats[i - 1] + f * (lats[i] - lats[i - 1]))
+                lons = np.insert(lons, i, lons[i - 1] + f * (lons[i] - lons[i - 1]))
+                times = np.insert(times, i, level_off)
 
-    distance_to_next_wp = haversine_distance(lat, long, next_waypoints[0][1][0], next_waypoints[0][1][1])
-    distance_remaining = pred_distance_covered - distance_to_next_wp
+    alts = predict_altitude(alt, vs, crz, times)
+    return list(zip(times.tolist(), lats.tolist(), lons.tolist(), alts.tolist()))
 
-    if distance_remaining < 0:
-        pred_lat, pred_long = great_circle_destination(lat, long, trk, pred_distance_covered)
-        return pred_lat, pred_long, pred_alt
+def interpolate_trajectory(trajectory, t):
+    for k in range(1, len(trajectory)):
+        t0, lat0, lon0, alt0 = trajectory[k - 1]
+        t1, lat1, lon1, alt1 = trajectory[k]
+        if t <= t1:
+            f = (t - t0) / (t1 - t0) if t1 > t0 else 0.0
+            return t, lat0 + f * (lat1 - lat0), lon0 + f * (lon1 - lon0), alt0 + f * (alt1 - alt0)
+    return None
 
-    lat = next_waypoints[0][1][0]
-    long = next_waypoints[0][1][1]
-    for i in range(1, len(next_waypoints)):
-        future_waypoint = next_waypoints[i]
-        distance = haversine_distance(lat, long, future_waypoint[1][0], future_waypoint[1][1])
-        new_distance_remaining = distance_remaining - distance
-        if new_distance_remaining < 0:
-            bearing = track_between_points(lat, long, future_waypoint[1][0], future_waypoint[1][1])
-            pred_lat, pred_long = great_circle_destination(lat, long, bearing, distance_remaining)
-            return pred_lat, pred_long, pred_alt
-        elif new_distance_remaining == 0:
-            return future_waypoint[1][0], future_waypoint[1][1], pred_alt
+def shift_trajectory(trajectory, elapsed, mins):
+    # Re-bases a trajectory predicted `elapsed` minutes ago onto the current
+    # time and cuts it at `mins` minutes ahead
+    if len(trajectory) < 2 or trajectory[-1][0] <= elapsed:
+        return []
 
-        distance_remaining = new_distance_remaining
+    start = interpolate_trajectory(trajectory, elapsed)
+    shifted = [(0.0, start[1], start[2], start[3])]
+    for t, lat, lon, alt in trajectory:
+        if t <= elapsed:
+            continue
+        if t - elapsed >= mins:
+            _, lat, lon, alt = interpolate_trajectory(trajectory, elapsed + mins)
+            shifted.append((float(mins), lat, lon, alt))
+            break
+        shifted.append((t - elapsed, lat, lon, alt))
 
-    return None, None, None
\ No newline at end of file
+    return shifted if len(shifted) > 1 else []
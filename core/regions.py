@@ -0,0 +1,114 @@
+import math
+
+import numpy as np
+
+from config import FACILITY_REGIONS, BOTTOM_LEFT_LIMIT, TOP_RIGHT_LIMIT, PREDICTION_MINUTES_AHEAD, \
+    REGION_MAX_GROUND_SPEED_KT, WAYPOINT_TOLERANCE_NM
+from core.collision import DEFAULT_SEPARATION, Separation
+from core.conflict_engine import alert_limits
+from utils.spatial_grid import boxes_overlap
+
+
+class Region:
+    # One facility's airspace, a lat/lon box or polygon, with its own
+    # separation minima
+    def __init__(self, name, box=None, polygon=None, separation=DEFAULT_SEPARATION):
+        if (box is None) == (polygon is None):
+            raise ValueError(f"Region {name} needs exactly one of box or polygon")
+
+        self.name = name
+        self.separation = separation
+        if box is not None:
+            (min_lat, min_lon), (max_lat, max_lon) = box
+            polygon = [(min_lat, min_lon), (min_lat, max_lon), (max_lat, max_lon), (max_lat, min_lon)]
+        elif len(polygon) < 3:
+            raise ValueError(f"Region {name} polygon needs at least 3 vertices")
+        self.is_box = box is not None
+        self.polygon = np.array(polygon, dtype=float)
+        self.bounds = (float(self.polygon[:, 0].min()), float(self.polygon[:, 1].min()),
+                       float(self.polygon[:, 0].max()), float(self.polygon[:, 1].max()))
+
+    def contains(self, lats, lons):
+        # Boolean mask of the points inside the region
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        min_lat, min_lon, max_lat, max_lon = self.bounds
+        inside = (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+        if self.is_box:
+            return inside
+
+        # Even-odd rule over the polygon edges, treating lat/lon as planar
+        crossings = np.zeros(len(lats), dtype=bool)
+        lat0, lon0 = self.polygon[-1]
+        for lat1, lon1 in self.polygon:
+            if lat0 != lat1:
+                spans = (lats >= min(lat0, lat1)) & (lats < max(lat0, lat1))
+                lon_at = lon0 + (lats - lat0) * (lon1 - lon0) / (lat1 - lat0)
+                crossings ^= spans & (lons < lon_at)
+            lat0, lon0 = lat1, lon1
+        return inside & crossings
+
+    def __repr__(self):
+        return f"Region({self.name!r}, {self.bounds})"
+
+
+def region_from_config(definition):
+    # {'name': ..., 'box': ((lat, lon), (lat, lon)) or 'polygon': [(lat, lon), ...]}
+    # plus any Separation field, e.g. 'lateral_red_nm': 3.0
+    separation = DEFAULT_SEPARATION._replace(**{field: definition[field] for field in Separation._fields
+                                               if field in definition})
+    return Region(definition['name'], definition.get('box'), definition.get('polygon'), separation)
+
+
+def load_regions(definitions):
+    regions = [region_from_config(definition) for definition in definitions or ()]
+    names = [region.name for region in regions]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate facility region names in {names}")
+    return regions
+
+
+def feed_margin_nm(regions):
+    # How far outside a region an aircraft can be and still come within alert
+    # separation of one inside it over the look-ahead: the alert limit, both
+    # route deviations and the travel of both aircraft
+    lateral_nm = max(alert_limits(region.separation)[0] for region in regions)
+    return lateral_nm + 2 * WAYPOINT_TOLERANCE_NM + 2 * REGION_MAX_GROUND_SPEED_KT * PREDICTION_MINUTES_AHEAD / 60
+
+
+def feed_limits(regions):
+    # Bottom-left and top-right corners of the ingest box: every region's
+    # bounds padded by feed_margin_nm, or the configured limits when no
+    # regions are set
+    if not regions:
+        return BOTTOM_LEFT_LIMIT, TOP_RIGHT_LIMIT
+
+    min_lat = min(region.bounds[0] for region in regions)
+    min_lon = min(region.bounds[1] for region in regions)
+    max_lat = max(region.bounds[2] for region in regions)
+    max_lon = max(region.bounds[3] for region in regions)
+    lat_pad = feed_margin_nm(regions) / 60
+    lon_pad = lat_pad / math.cos(math.radians(min(89.0, max(abs(min_lat), abs(max_lat)) + lat_pad)))
+    return ((max(-90.0, min_lat - lat_pad), max(-180.0, min_lon - lon_pad)),
+            (min(90.0, max_lat + lat_pad), min(180.0, max_lon + lon_pad)))
+
+
+def region_members(region, table, rows, boxes):
+    # Indices into rows of the aircraft probed for the region: those inside it
+    # plus those whose broad-phase box reaches the extent of the insiders'
+    # boxes, so every pair with one aircraft inside can be found. Also
+    # returns the set of table rows inside the region.
+    inside = region.contains(table.latitude[rows], table.longitude[rows])
+    inside_boxes = [boxes[k] for k in np.flatnonzero(inside).tolist() if boxes[k] is not None]
+    if not inside_boxes:
+        return [], set()
+
+    extent = (min(box[0] for box in inside_boxes), min(box[1] for box in inside_boxes),
+              max(box[2] for box in inside_boxes), max(box[3] for box in inside_boxes),
+              min(box[4] for box in inside_boxes), max(box[5] for box in inside_boxes))
+    members = [k for k, box in enumerate(boxes) if inside[k] or (box is not None and boxes_overlap(box, extent))]
+    return members, {rows[k] for k in np.flatnonzero(inside).tolist()}
+
+
+regions = load_regions(FACILITY_REGIONS)
+FEED_BOTTOM_LEFT, FEED_TOP_RIGHT = feed_limits(regions)
@@ -1,17 +1,83 @@
-from utils.great_circle import is_point_on_path
+import numpy as np
 
+from config import WAYPOINT_TOLERANCE_NM
+from utils.geo_constants import EARTH_RADIUS_NM
+from utils.great_circle import arc_frames, latlon_to_unit_array, points_on_path_array, radians_to_nm
 
-def get_current_route_segment(waypoints, current_position):
-    for i in range(len(waypoints)):
-        current_waypoint = waypoints[i]
-        next_waypoint = waypoints[i + 1] if i + 1 < len(waypoints) else None
 
-        if next_waypoint is None:
-            break
+def build_route_geometry(waypoints):
+    # Per-leg great-circle frame (start vector u, in-plane normal v, arc extent)
+    # and a padded lat/lon box, computed once per expanded route
+    if len(waypoints) < 2:
+        return None
 
-        result = is_point_on_path(current_waypoint[1], next_waypoint[1], current_position)
-        if result is not None and result[0]:
-            on_path, nm_dev = result
-            return (current_waypoint, next_waypoint), nm_dev
+    coords = np.array([wp[1] for wp in waypoints], dtype=float)
+    points = latlon_to_unit_array(coords[:, 0], coords[:, 1])
+    u = points[:-1]
+    w = points[1:]
+    v, delta, degenerate = arc_frames(u, w)
 
-    return None
\ No newline at end of file
+    # Great-circle arcs bulge poleward of their end points; pad the boxes by
+    # the on-path tolerance plus a bound on that bulge
+    lat_start, lat_end = coords[:-1, 0], coords[1:, 0]
+    max_abs_lat = np.minimum(89.0, np.maximum(np.abs(lat_start), np.abs(lat_end)))
+    leg_nm = radians_to_nm(np.arccos(np.clip(np.sum(u * w, axis=1), -1.0, 1.0)))
+    bulge_nm = leg_nm ** 2 / (8 * EARTH_RADIUS_NM) * np.maximum(1.0, np.tan(np.radians(max_abs_lat)))
+    pad_nm = WAYPOINT_TOLERANCE_NM + bulge_nm
+    lat_pad = pad_nm / 60
+    lon_pad = pad_nm / (60 * np.cos(np.radians(np.minimum(89.0, max_abs_lat + lat_pad))))
+
+    lon_start, lon_end = coords[:-1, 1], coords[1:, 1]
+    return {
+        'u': u,
+        'v': v,
+        'w': w,
+        'delta': delta,
+        'degenerate': degenerate,
+        'min_lat': np.minimum(lat_start, lat_end) - lat_pad,
+        'max_lat': np.maximum(lat_start, lat_end) + lat_pad,
+        'min_lon': np.minimum(lon_start, lon_end) - lon_pad,
+        'max_lon': np.maximum(lon_start, lon_end) + lon_pad,
+    }
+
+
+def match_legs(geometry, legs, p):
+    # (on_path, nm_dev) for the given leg indices against unit vector p
+    in_arc, on_path, nm_dev = points_on_path_array(geometry['u'][legs], geometry['v'][legs], geometry['w'][legs],
+                                                   geometry['delta'][legs], geometry['degenerate'][legs], p)
+    return in_arc & on_path, nm_dev
+
+
+def get_current_route_segment(waypoints, current_position, geometry=None, start_index=None):
+    # Returns ((from_wp, to_wp), nm_dev, leg_index) for the leg the aircraft is
+    # on. The leg matched last cycle (start_index) and the one after it are
+    # tried first; otherwise the earliest matching leg along the route wins.
+    if geometry is None:
+        geometry = build_route_geometry(waypoints)
+    if geometry is None:
+        return None
+
+    lat, lon = current_position
+    candidates = np.flatnonzero((geometry['min_lat'] <= lat) & (lat <= geometry['max_lat']) &
+                                (geometry['min_lon'] <= lon) & (lon <= geometry['max_lon']))
+    if candidates.size == 0:
+        return None
+
+    p = latlon_to_unit_array(lat, lon)
+
+    if start_index is not None:
+        nearby = candidates[(candidates == start_index) | (candidates == start_index + 1)]
+        if nearby.size > 0:
+            on_path, nm_dev = match_legs(geometry, nearby, p)
+            if np.any(on_path):
+                k = int(np.argmax(on_path))
+                i = int(nearby[k])
+                return (waypoints[i], waypoints[i + 1]), float(nm_dev[k]), i
+
+    on_path, nm_dev = match_legs(geometry, candidates, p)
+    if not np.any(on_path):
+        return None
+
+    k = int(np.argmax(on_path))
+    i = int(candidates[k])
+    return (waypoints[i], waypoints[i + 1]), float(nm_dev[k]), i
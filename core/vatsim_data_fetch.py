@@ -1,44 +1,185 @@
-from config import VATSIM_DATA_URL, BOTTOM_LEFT_LIMIT, TOP_RIGHT_LIMIT, ALTITUDE_LIMIT_FT
+import gzip
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import VATSIM_DATA_URL, ALTITUDE_LIMIT_FT, VATSIM_FETCH_TIMEOUT_SECONDS
+from core.aircraft_table import AircraftTable
+from core.regions import FEED_BOTTOM_LEFT, FEED_TOP_RIGHT
+from utils import metrics
+from utils.json_stream import JsonStream
 from utils.vertical_speed import batch_compute_vertical_speed
 
-def fetch_vatsim_data():
-    import requests
+FEED_CHUNK_BYTES = 64 * 1024
 
-    min_lat = BOTTOM_LEFT_LIMIT[0]
-    min_lon = BOTTOM_LEFT_LIMIT[1]
-    max_lat = TOP_RIGHT_LIMIT[0]
-    max_lon = TOP_RIGHT_LIMIT[1]
 
-    response = requests.get(VATSIM_DATA_URL)
-    data = response.json()
+class VatsimFeedFetcher:
+    def __init__(self, url=VATSIM_DATA_URL, timeout=VATSIM_FETCH_TIMEOUT_SECONDS):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+        self.etag = None
+        self.last_modified = None
+        self.update_timestamp = None
+
+    def fetch_pilots(self):
+        # Streams the feed and returns the filtered pilots, or None when the
+        # snapshot has not changed since the previous fetch
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+
+        with metrics.timer('fetch'):
+            response = self.session.get(self.url, headers=headers, timeout=self.timeout, stream=True)
+        with response:
+            if response.status_code == 304:
+                metrics.count('feed_unchanged')
+                return None
+            response.raise_for_status()
+
+            chunks = response.iter_content(FEED_CHUNK_BYTES)
+            update_timestamp, pilots = read_feed(metrics.timed_iter(chunks, 'fetch', 'parse'), self.update_timestamp)
+            # read_feed stops after the pilots; the rest of the body is read
+            # unparsed so the connection goes back to the pool instead of
+            # being closed
+            with metrics.timer('fetch'):
+                for _ in chunks:
+                    pass
+            # Only a body that parsed is cached against, a truncated one is
+            # fetched in full again
+            self.etag = response.headers.get('ETag')
+            self.last_modified = response.headers.get('Last-Modified')
+            if pilots is None:
+                metrics.count('feed_unchanged')
+                return None
+
+            self.update_timestamp = update_timestamp
+            return pilots
+
+
+class FeedFileFetcher:
+    # Reads a recorded feed snapshot (plain or .gz) through the same streaming
+    # parser as the live feed
+    def __init__(self, path):
+        self.path = path
+        self.update_timestamp = None
+
+    def fetch_pilots(self):
+        opener = gzip.open if self.path.endswith('.gz') else open
+        with opener(self.path, 'rb') as f:
+            chunks = metrics.timed_iter(iter(lambda: f.read(FEED_CHUNK_BYTES), b''), 'fetch', 'parse')
+            update_timestamp, pilots = read_feed(chunks, self.update_timestamp)
+        if pilots is None:
+            return None
+
+        self.update_timestamp = update_timestamp
+        return pilots
+
+
+def read_feed(chunks, previous_update_timestamp=None):
+    # Returns (update_timestamp, pilot rows). Only the general block and the pilots
+    # array are decoded, one pilot at a time; reading stops as soon as both
+    # have been seen. pilots is None when update_timestamp matches the
+    # previous one.
+    stream = JsonStream(chunks)
+    update_timestamp = None
+    pilots = None
+    for key in stream.members():
+        if key == 'general':
+            update_timestamp = stream.decode_value().get('update_timestamp')
+            if update_timestamp is not None and update_timestamp == previous_update_timestamp:
+                return update_timestamp, None
+        elif key == 'pilots':
+            pilots = []
+            seen = 0
+            for pilot in stream.values():
+                seen += 1
+                row = pilot_to_row(pilot)
+                if row is not None:
+                    pilots.append(row)
+            metrics.count('feed_pilots', seen)
+        else:
+            stream.skip_value()
+
+        if update_timestamp is not None and pilots is not None:
+            break
+
+    return update_timestamp, pilots or []
 
-    pilots = []
 
+def parse_cruising_altitude(altitude):
+    # The feed files altitude as a string ("35000"); prediction needs feet as an int
+    if isinstance(altitude, int):
+        return altitude
+    if isinstance(altitude, str) and altitude.strip().isdigit():
+        return int(altitude)
+    return None
+
+
+def pilot_to_row(pilot):
+    flight_plan = pilot.get('flight_plan')
+    lat = pilot.get('latitude')
+    lon = pilot.get('longitude')
+    altitude = pilot.get('altitude')
+
+    if flight_plan is None:
+        return None
+    elif flight_plan.get('flight_rules') == 'V':
+        return None
+    elif lat is None or lon is None or altitude is None or (ALTITUDE_LIMIT_FT is not None and altitude < ALTITUDE_LIMIT_FT):
+        return None
+    elif (lat < FEED_BOTTOM_LEFT[0] or lat > FEED_TOP_RIGHT[0]) or (lon < FEED_BOTTOM_LEFT[1] or lon > FEED_TOP_RIGHT[1]):
+        return None
+
+    # Row in AircraftTable FEED_COLUMNS order
+    return (
+        pilot.get('callsign'),
+        lat,
+        lon,
+        altitude,
+        pilot.get('groundspeed'),
+        pilot.get('heading'),
+        flight_plan.get('departure'),
+        flight_plan.get('arrival'),
+        flight_plan.get('route'),
+        parse_cruising_altitude(flight_plan.get('altitude')),
+    )
+
+
+def filter_pilots(data):
+    pilots = []
     for pilot in data['pilots']:
-        lat = pilot.get('latitude')
-        lon = pilot.get('longitude')
-        altitude = pilot.get('altitude')
-
-        if pilot.get('flight_plan') is None:
-            continue
-        elif pilot.get('flight_plan').get('flight_rules') == 'V':
-            continue
-        elif lat is None or lon is None or altitude is None or (ALTITUDE_LIMIT_FT is not None and altitude < ALTITUDE_LIMIT_FT):
-            continue
-        elif (lat < min_lat or lat > max_lat) or (lon < min_lon or lon > max_lon):
-            continue
-        pilots.append({
-            'callsign': pilot.get('callsign'),
-            'latitude': lat,
-            'longitude': lon,
-            'altitude': altitude,
-            'ground_speed': pilot.get('groundspeed'),
-            'heading': pilot.get('heading'),
-            'departure': pilot.get('flight_plan', {}).get('departure'),
-            'arrival': pilot.get('flight_plan', {}).get('arrival'),
-            'route': pilot.get('flight_plan', {}).get('route'),
-            'cruising_altitude': pilot.get('flight_plan', {}).get('altitude'),
-            'vertical_speed': 0,
-        })
-
-    return batch_compute_vertical_speed(pilots)
\ No newline at end of file
+        row = pilot_to_row(pilot)
+        if row is not None:
+            pilots.append(row)
+    return pilots
+
+
+default_fetcher = None
+
+
+def fetch_vatsim_data(fetcher=None, now=None):
+    # The table of a new snapshot, or None when the snapshot has not changed
+    # since the previous fetch
+    global default_fetcher
+
+    if fetcher is None:
+        if default_fetcher is None:
+            default_fetcher = VatsimFeedFetcher()
+        fetcher = default_fetcher
+
+    rows = fetcher.fetch_pilots()
+    if rows is None:
+        return None
+
+    with metrics.timer('parse'):
+        table = AircraftTable(rows)
+    with metrics.timer('vertical_speed'):
+        table = batch_compute_vertical_speed(table, now)
+    return table
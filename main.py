@@ -1,43 +1,179 @@
 import time
+import traceback
 
-from config import print_config_vars, PREDICTION_PRECISION_MINUTES, PREDICTION_MINUTES_AHEAD, REPEAT_TIME
-from core.collision import get_collision_status, get_status_text
-from core.position_prediction import predict_lat_long_alt
+import numpy as np
+
+from config import print_config_vars, REPEAT_TIME, INCREMENTAL_PROBING, PARALLEL_PROBING, METRICS_PORT
+import core.conflict_engine as conflict_engine
+from core.conflict_engine import collect_conflicts, find_conflicts, predict, predicted_boxes, select_predicted
+from core.conflict_registry import ConflictRegistry
+from core.flightplan_route import get_route, route_cache_stats
+from core.incremental import IncrementalProbe
+from core.parallel import parallel_cpa_conflicts
+from core.regions import regions, region_members
 from core.route_segment import get_current_route_segment
 from core.vatsim_data_fetch import fetch_vatsim_data
+import utils.faa as faa
+from utils import metrics
+
+# Leg index each callsign was matched to last cycle, used as the search start
+last_route_legs = {}
+incremental_probe = IncrementalProbe()
+conflict_registry = ConflictRegistry()
+region_registries = {region.name: ConflictRegistry(region.separation) for region in regions}
+# Result of the last probed snapshot, returned again while the feed is unchanged
+last_status = None
+last_region_status = None
+
+
+def reset_probe_state():
+    # Forget everything kept across cycles, as if the probe had just started
+    global incremental_probe, conflict_registry, region_registries, last_status, last_region_status
+    last_route_legs.clear()
+    incremental_probe = IncrementalProbe()
+    conflict_registry = ConflictRegistry()
+    region_registries = {region.name: ConflictRegistry(region.separation) for region in regions}
+    last_status = None
+    last_region_status = None
+
+
+def probe_mode():
+    # Detection path detect_conflicts takes: 'incremental', 'parallel' or the
+    # conflict engine
+    if INCREMENTAL_PROBING:
+        return 'incremental'
+    elif PARALLEL_PROBING and conflict_engine.CONFLICT_ENGINE == 'cpa':
+        return 'parallel'
+    return conflict_engine.CONFLICT_ENGINE
+
+
+def expand_routes(table):
+    before = route_cache_stats()
+    table.set_routes([get_route(departure, route, arrival)
+                      for departure, route, arrival in zip(table.departures, table.routes, table.arrivals)])
+    after = route_cache_stats()
+    metrics.count('route_cache_hits', after['hits'] - before['hits'])
+    metrics.count('route_cache_misses', after['misses'] - before['misses'])
+
+
+def locate_route_segments(table):
+    matched_legs = {}
+    for i, callsign in enumerate(table.callsigns):
+        route_id = table.route_ids[i]
+        result = get_current_route_segment(table.route_waypoints[route_id],
+                                           (table.latitude[i], table.longitude[i]),
+                                           table.route_geometries[route_id],
+                                           last_route_legs.get(callsign))
+
+        if result is None:
+            continue
+
+        _, nm_dev, leg_index = result
+        table.leg[i] = leg_index
+        table.deviation[i] = nm_dev
+        matched_legs[callsign] = leg_index
+
+    # Only callsigns still on a route are remembered for the next cycle
+    last_route_legs.clear()
+    last_route_legs.update(matched_legs)
+
+
+def probe_rows(table):
+    # Rows on a route segment that are not still departing or already arriving
+    rows = []
+    for i in np.flatnonzero(table.leg >= 0).tolist():
+        waypoints = table.route_of(i)
+        segment_start = waypoints[table.leg[i]]
+        segment_end = waypoints[table.leg[i] + 1]
+        if segment_start != segment_end \
+                and segment_start[0] != table.departures[i] \
+                and segment_end[0] != table.arrivals[i]:
+            rows.append(i)
+    return rows
+
+
+def detect_conflicts(table, rows, now):
+    # Returns the conflicting pairs and the predict() output of the rows, or
+    # None when the engine keeps its own trajectories
+    mode = probe_mode()
+    if mode == 'incremental':
+        return incremental_probe.update(table, rows, now), None
+    elif mode == 'parallel':
+        return parallel_cpa_conflicts(table, rows), None
+
+    with metrics.timer('prediction'):
+        predicted = predict(table, rows)
+    with metrics.timer('pairs'):
+        return find_conflicts(table, rows, predicted), predicted
+
+
+def detect_region_conflicts(table, rows):
+    # Trajectories are predicted once for every probed row; each region then
+    # runs detection with its own minima on the rows that can reach it and
+    # keeps the pairs with at least one aircraft inside it. Also returns the
+    # shared predict() output.
+    with metrics.timer('prediction'):
+        predicted = predict(table, rows)
 
+    region_conflicts = {}
+    with metrics.timer('pairs'):
+        for region in regions:
+            members, inside = region_members(region, table, rows,
+                                             predicted_boxes(table, rows, predicted, region.separation))
+            pair_conflicts = find_conflicts(table, [rows[k] for k in members], select_predicted(predicted, members),
+                                            region.separation)
+            region_conflicts[region.name] = ([row for row in rows if row in inside],
+                                             [(a, b, result) for a, b, result in pair_conflicts
+                                              if a in inside or b in inside])
+    return region_conflicts, predicted
+
+
+def report_conflicts(table, rows, report_rows, pair_conflicts, predicted, registry, now):
+    # Alerts of one detection pass as (conflicting, non-conflicting) Aircraft
+    # among report_rows, which only carry each aircraft's earliest partner,
+    # and every alerted pair as (callsign, callsign, result); rows are every
+    # probed row this cycle
+    metrics.count('conflict_pairs', len(pair_conflicts))
+    with metrics.timer('alerts'):
+        alerted = registry.update(table, rows, pair_conflicts, now, predicted)
+    metrics.count('alerted_pairs', len(alerted))
+    with metrics.timer('collect'):
+        table.clear_conflicts()
+        conflicting_rows, non_conflicting_rows = collect_conflicts(table, report_rows, alerted)
+    metrics.count('conflicting_aircraft', len(conflicting_rows))
+    return [table.aircraft(i) for i in conflicting_rows], [table.aircraft(i) for i in non_conflicting_rows], \
+        [(table.callsigns[a], table.callsigns[b], result) for a, b, result in alerted]
+
+
+def ingest(now):
+    # Fetch, route expansion and segment matching shared by every region;
+    # returns the table and the rows to probe, or (None, None) when the feed
+    # has not changed since the last probed snapshot
+
+    # A new navdata cycle loaded in the background takes effect between cycles;
+    # leg hints index into routes expanded with the old one
+    if faa.apply_pending_navdata(now):
+        last_route_legs.clear()
+        metrics.count('navdata_swaps')
 
-def get_aircraft_conflict_status():
     # print("Fetching data from VATSIM...")
-    data = fetch_vatsim_data()
-    # print(f"Successfully fetched {len(data)} airplane(s) from VATSIM within lat/lon and altitude limits.")
+    table = fetch_vatsim_data(now=now)
+    if table is None:
+        return None, None
+    metrics.count('aircraft', len(table))
+    # print(f"Successfully fetched {len(table)} airplane(s) from VATSIM within lat/lon and altitude limits.")
     # print()
     # print("Converting aircraft routes to lat/lon coordinates...")
 
-    for aircraft in data:
-        from core.flightplan_route import route_to_lat_lon
-        departure = aircraft.get('departure', '')
-        arrival = aircraft.get('arrival', '')
-        route = aircraft.get('route', '')
-        lat_lon_coords = route_to_lat_lon(f"{departure} {route} {arrival}")
-        aircraft['route_lat_lon'] = lat_lon_coords
+    with metrics.timer('routes'):
+        expand_routes(table)
 
     # print("Successfully converted all aircraft routes to lat/lon coordinates.")
     # print()
     # print("Computing current route segment for all aircraft...")
 
-    for aircraft in data:
-        result = get_current_route_segment(aircraft['route_lat_lon'],
-                                                    (aircraft['latitude'], aircraft['longitude']))
-
-        if result is None:
-            aircraft['current_route_segment'] = None
-            aircraft['current_route_segment_nm_deviation'] = None
-            continue
-
-        segment, nm_dev = result
-        aircraft['current_route_segment'] = segment
-        aircraft['current_route_segment_nm_deviation'] = nm_dev
+    with metrics.timer('segments'):
+        locate_route_segments(table)
 
     # print("Successfully computed current route segment for all aircraft.")
     # print()
@@ -45,92 +181,60 @@ def get_aircraft_conflict_status():
     #     "Filtering out all aircraft that are not on a route segment or are transitioning from origin or arriving to destination...")
     # print("(SID and STAR logic will be implemented later)")
     # print()
-    data = [
-        ac for ac in data
-        if ac['current_route_segment'] is not None
-           and ac['current_route_segment'][0] is not None
-           and ac['current_route_segment'][1] is not None
-           and ac['current_route_segment'][0] != ac['current_route_segment'][1]
-           and ac['current_route_segment'][0] != ac['departure']
-           and ac['current_route_segment'][1] != ac['arrival']
-    ]
-    # print(f"{len(data)} aircraft remain after filtering.")
+    with metrics.timer('segments'):
+        rows = probe_rows(table)
+    metrics.count('probed', len(rows))
+    metrics.count('filtered', len(table) - len(rows))
+    # print(f"{len(rows)} aircraft remain after filtering.")
     # print()
-    # print("Computing predicted position and conflicts for all aircraft (This will take some time)...")
-    conflicting_aircraft = []
-    conflicting_callsigns = set()
-    non_conflicting_aircraft = []
-    non_conflicting_aircraft_callsigns = set()
-    i = 0
-    while i <= PREDICTION_MINUTES_AHEAD:
-        temp_aircraft = []
-        for ac in data:
-            if ac['callsign'] in conflicting_callsigns:
-                temp_aircraft.append(ac)
-                continue
-
-            lat = ac['latitude']
-            lon = ac['longitude']
-            alt = ac['altitude']
-            vs = ac['vertical_speed']
-            gs = ac['ground_speed']
-            trk = ac['heading']
-            cruise_alt = ac['cruising_altitude']
-
-            segment = ac['current_route_segment']
-            next_waypoint = segment[1]
-            all_waypoints = ac['route_lat_lon']
-
-            lat, lon, alt = predict_lat_long_alt(lat, lon, alt, vs, gs, trk, next_waypoint, all_waypoints, cruise_alt, i)
-
-            if lat is None or lon is None or alt is None:
-                continue
-
-            ac['p_latitude'] = lat
-            ac['p_longitude'] = lon
-            ac['p_altitude'] = alt
-            temp_aircraft.append(ac)
-
-        for ac in temp_aircraft:
-            if ac['callsign'] in conflicting_callsigns:
-                continue
-            for ac2 in temp_aircraft:
-                if ac2['callsign'] == ac['callsign']:
-                    continue
-
-                ac_lat = ac['p_latitude']
-                ac_lon = ac['p_longitude']
-                ac_alt = ac['p_altitude']
-                ac_dev = ac['current_route_segment_nm_deviation']
-
-                ac2_lat = ac2['p_latitude']
-                ac2_lon = ac2['p_longitude']
-                ac2_alt = ac2['p_altitude']
-                ac2_dev = ac2['current_route_segment_nm_deviation']
-
-                collision_status = get_collision_status(
-                    (ac_lat, ac_lon, ac_alt, ac_dev),
-                    (ac2_lat, ac2_lon, ac2_alt, ac2_dev)
-                )
-
-                ac['conflict_status'] = collision_status
-
-                if collision_status > 0:
-                    ac['conflicting_callsign'] = ac2['callsign']
-                    ac['conflict_time_minutes_ahead'] = i
-                    ac['conflict_level'] = get_status_text(collision_status)
-                    conflicting_aircraft.append(ac)
-                    conflicting_callsigns.add(ac['callsign'])
-                    conflicting_callsigns.add(ac2['callsign'])
-
-            if ac['callsign'] not in conflicting_callsigns and ac['callsign'] not in non_conflicting_aircraft_callsigns:
-                non_conflicting_aircraft.append(ac)
-                non_conflicting_aircraft_callsigns.add(ac['callsign'])
-
-        i += PREDICTION_PRECISION_MINUTES
+    return table, rows
+
+
+def get_aircraft_conflict_status(now=None):
+    # An unchanged snapshot is not probed again: the last result is returned
+    # with the time of the snapshot it came from
+    global last_status
+
+    if now is None:
+        now = time.time()
+    metrics.start_cycle(now)
+    table, rows = ingest(now)
+    if table is None:
+        metrics.finish_cycle()
+        return last_status or ([], [], [], now)
+
+    # print("Computing predicted position and conflicts for all aircraft...")
+    pair_conflicts, predicted = detect_conflicts(table, rows, now)
+    conflicting, non_conflicting, alerted = report_conflicts(table, rows, rows, pair_conflicts, predicted,
+                                                             conflict_registry, now)
+    metrics.finish_cycle()
 
     # print("Successfully computed predicted position and conflicts for all aircraft.")
-    return conflicting_aircraft, non_conflicting_aircraft, time.time()
+    last_status = conflicting, non_conflicting, alerted, now
+    return last_status
+
+
+def get_region_conflict_status(now=None):
+    # Like get_aircraft_conflict_status for every configured facility region:
+    # returns {region name: (conflicting, non-conflicting, alerted)} and the time
+    global last_region_status
+
+    if now is None:
+        now = time.time()
+    metrics.start_cycle(now)
+    table, rows = ingest(now)
+    if table is None:
+        metrics.finish_cycle()
+        return last_region_status or ({name: ([], [], []) for name in region_registries}, now)
+
+    region_conflicts, predicted = detect_region_conflicts(table, rows)
+    results = {}
+    for name, (report_rows, pair_conflicts) in region_conflicts.items():
+        results[name] = report_conflicts(table, rows, report_rows, pair_conflicts, predicted, region_registries[name],
+                                         now)
+    metrics.finish_cycle()
+    last_region_status = results, now
+    return last_region_status
 
 
 if __name__ == "__main__":
@@ -142,10 +246,31 @@ if __name__ == "__main__":
     print("Configuration:")
     print_config_vars()
     print()
+    if METRICS_PORT:
+        metrics.serve(METRICS_PORT)
+    faa.start_navdata_watcher()
     # print()
     while True:
         print("-----------------------------------------------")
-        conflicting, non_conflicting, timestamp = get_aircraft_conflict_status()
+        try:
+            if regions:
+                results, timestamp = get_region_conflict_status()
+            else:
+                conflicting, non_conflicting, alerted, timestamp = get_aircraft_conflict_status()
+        except Exception:
+            # A bad poll (feed down, malformed snapshot) skips this cycle, the next one retries
+            traceback.print_exc()
+            time.sleep(REPEAT_TIME)
+            continue
+
+        if regions:
+            for name, (conflicting, non_conflicting, alerted) in results.items():
+                print(f"{name}: {len(conflicting)} alert(s)")
+                for aircraft in conflicting:
+                    print(f"  {aircraft.callsign} <-> {aircraft.conflicting_callsign}: {aircraft.conflict_level} in {aircraft.conflict_time_minutes_ahead} min(s)")
+            time.sleep(REPEAT_TIME)
+            continue
+
         # print()
         # print()
         # print(f"Total aircraft: {len(conflicting) + len(non_conflicting)}")
@@ -157,6 +282,6 @@ if __name__ == "__main__":
             print("No alerts detected!")
         else:
             for aircraft in conflicting:
-                print(f"{aircraft['callsign']} <-> {aircraft['conflicting_callsign']}: {aircraft['conflict_level']} in {aircraft['conflict_time_minutes_ahead']} min(s)")
+                print(f"{aircraft.callsign} <-> {aircraft.conflicting_callsign}: {aircraft.conflict_level} in {aircraft.conflict_time_minutes_ahead} min(s)")
 
         time.sleep(REPEAT_TIME)
@@ -0,0 +1,131 @@
+import argparse
+import gzip
+import json
+import os
+import sys
+import tarfile
+import time
+import zipfile
+from datetime import datetime, timezone
+
+import core.vatsim_data_fetch as vatsim_data_fetch
+import main
+import utils.vertical_speed as vertical_speed
+from config import VERTICAL_SPEED_SAMPLES, VERTICAL_SPEED_TTL_SECONDS, VERTICAL_SPEED_SNAPSHOT_SECONDS
+from core.regions import regions
+from core.vatsim_data_fetch import FEED_CHUNK_BYTES, read_feed
+
+SNAPSHOT_SUFFIXES = ('.json', '.json.gz')
+
+
+class SnapshotFetcher:
+    # Stands in for the live fetcher: hands the probe the rows of the snapshot
+    # being replayed
+    def __init__(self):
+        self.rows = []
+
+    def fetch_pilots(self):
+        return self.rows
+
+
+def read_member(name, file):
+    if name.endswith('.gz'):
+        file = gzip.GzipFile(fileobj=file)
+    return b''.join(iter(lambda: file.read(FEED_CHUNK_BYTES), b''))
+
+
+def snapshots(path):
+    # Yields (name, feed bytes) in name order from a directory, a .zip or a
+    # (compressed) tar archive of .json / .json.gz feed snapshots
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.endswith(SNAPSHOT_SUFFIXES):
+                with open(os.path.join(path, name), 'rb') as f:
+                    yield name, read_member(name, f)
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for name in sorted(archive.namelist()):
+                if name.endswith(SNAPSHOT_SUFFIXES):
+                    with archive.open(name) as f:
+                        yield name, read_member(name, f)
+    elif tarfile.is_tarfile(path):
+        with tarfile.open(path) as archive:
+            members = sorted((member for member in archive.getmembers()
+                              if member.isfile() and member.name.endswith(SNAPSHOT_SUFFIXES)),
+                             key=lambda member: member.name)
+            for member in members:
+                yield member.name, read_member(member.name, archive.extractfile(member))
+    else:
+        raise ValueError(f"{path} is not a directory, zip or tar archive of feed snapshots")
+
+
+def parse_update_timestamp(update_timestamp):
+    # "2024-05-01T19:00:03.1234567Z" -> seconds since the epoch
+    whole, _, fraction = update_timestamp.rstrip('Z').partition('.')
+    moment = datetime.strptime(whole, '%Y-%m-%dT%H:%M:%S').replace(tzinfo=timezone.utc)
+    return moment.timestamp() + (float('0.' + fraction) if fraction else 0.0)
+
+
+def replay(path, output):
+    fetcher = SnapshotFetcher()
+    vatsim_data_fetch.default_fetcher = fetcher
+    # Replay state starts empty and is never persisted over the live snapshot
+    vertical_speed.tracker = vertical_speed.VerticalSpeedTracker(None, VERTICAL_SPEED_SAMPLES, VERTICAL_SPEED_TTL_SECONDS,
+                                                                 VERTICAL_SPEED_SNAPSHOT_SECONDS)
+
+    processed = 0
+    skipped = 0
+    last_now = None
+    start = time.perf_counter()
+    for name, data in snapshots(path):
+        update_timestamp, rows = read_feed([data])
+        if update_timestamp is None:
+            print(f"Skipping {name}: no update_timestamp", file=sys.stderr)
+            skipped += 1
+            continue
+
+        # The snapshot's own timestamp is the probe clock, repeated or
+        # out-of-order snapshots would run it backwards
+        now = parse_update_timestamp(update_timestamp)
+        if last_now is not None and now <= last_now:
+            skipped += 1
+            continue
+        last_now = now
+
+        fetcher.rows = rows
+        if regions:
+            results, _ = main.get_region_conflict_status(now)
+        else:
+            conflicting, non_conflicting, alerted, _ = main.get_aircraft_conflict_status(now)
+            results = {None: (conflicting, non_conflicting, alerted)}
+        for region, (conflicting, _, _) in results.items():
+            for aircraft in conflicting:
+                record = {
+                    'update_timestamp': update_timestamp,
+                    'callsign': aircraft.callsign,
+                    'conflicting_callsign': aircraft.conflicting_callsign,
+                    'conflict_level': aircraft.conflict_level,
+                    'conflict_time_minutes_ahead': aircraft.conflict_time_minutes_ahead,
+                }
+                if region is not None:
+                    record['region'] = region
+                output.write(json.dumps(record) + '\n')
+        processed += 1
+
+    print(f"Replayed {processed} snapshot(s), skipped {skipped}, in {time.perf_counter() - start:.2f} seconds",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the probe over recorded VATSIM feed snapshots as fast as "
+                                                 "possible, using each snapshot's update_timestamp as the clock. "
+                                                 "Writes one JSON object per conflicting aircraft and snapshot.")
+    parser.add_argument('path', help="directory, .zip or .tar[.gz] of .json / .json.gz snapshots")
+    parser.add_argument('--output', help="write conflicts to this file instead of stdout")
+    args = parser.parse_args()
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            replay(args.path, output)
+    else:
+        replay(args.path, sys.stdout)
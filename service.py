@@ -0,0 +1,47 @@
+import time
+import traceback
+
+from config import print_config_vars, REPEAT_TIME, SERVICE_HOST, SERVICE_PORT, METRICS_PORT
+from core.alerts import AlertHub, conflict_pairs, serve
+from core.regions import regions
+from main import get_aircraft_conflict_status, get_region_conflict_status
+import utils.faa as faa
+from utils import metrics
+
+if __name__ == "__main__":
+    print("-----------------------------------------------")
+    print("VATSIM Collision Probing (FAA Only) - Alert Service")
+    print("-----------------------------------------------")
+    print()
+    print("Configuration:")
+    print_config_vars()
+    print()
+
+    # One hub per facility region, or a single one at the root
+    hubs = {f'/regions/{region.name}': AlertHub() for region in regions} if regions else {'': AlertHub()}
+    serve(hubs, SERVICE_HOST, SERVICE_PORT)
+    if METRICS_PORT:
+        metrics.serve(METRICS_PORT)
+    faa.start_navdata_watcher()
+    for prefix in hubs:
+        print(f"Serving conflicts on http://{SERVICE_HOST}:{SERVICE_PORT}{prefix}/conflicts and {prefix}/events")
+
+    while True:
+        try:
+            if regions:
+                results, timestamp = get_region_conflict_status()
+                results = {f'/regions/{name}': result for name, result in results.items()}
+            else:
+                conflicting, non_conflicting, alerted, timestamp = get_aircraft_conflict_status()
+                results = {'': (conflicting, non_conflicting, alerted)}
+        except Exception:
+            # A failed cycle keeps the last published set, the next one retries
+            traceback.print_exc()
+        else:
+            for prefix, (conflicting, non_conflicting, alerted) in results.items():
+                delta = hubs[prefix].publish(conflict_pairs(alerted, timestamp), timestamp)
+                if delta is not None:
+                    print(f"{prefix or '/'} #{delta['sequence']}: {len(delta['new'])} new, {len(delta['updated'])} "
+                          f"updated, {len(delta['cleared'])} cleared, {len(alerted)} active")
+
+        time.sleep(REPEAT_TIME)
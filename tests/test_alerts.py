@@ -0,0 +1,59 @@
+import unittest
+
+from core.alerts import AlertHub, conflict_pairs
+
+
+def result(status, minutes, cpa_distance_nm=None, onset=0.0):
+    return {'status': status, 'time_minutes_ahead': minutes, 'cpa_time_minutes_ahead': None,
+            'cpa_distance_nm': cpa_distance_nm, 'onset': onset}
+
+
+class ConflictPairsTest(unittest.TestCase):
+    def test_every_alerted_pair_is_kept(self):
+        # A and B both have an earlier partner, their own pair still counts
+        pairs = conflict_pairs([('A', 'B', result(2, 5)), ('C', 'A', result(1, 2)), ('B', 'D', result(1, 3))], 1000)
+        self.assertEqual(sorted(pairs), [('A', 'B'), ('A', 'C'), ('B', 'D')])
+        self.assertEqual(pairs[('A', 'B')], {'callsigns': ['A', 'B'], 'level': 'RED', 'conflict_time': 1300,
+                                             'cpa_distance_nm': None, 'onset': 0.0})
+        self.assertEqual(pairs[('A', 'C')]['level'], 'YELLOW')
+        self.assertEqual(conflict_pairs([('A', 'B', result(2, 5, 0.04321))], 0)[('A', 'B')]['cpa_distance_nm'], 0.0)
+
+
+class AlertHubTest(unittest.TestCase):
+    def publish(self, alerted, timestamp):
+        return self.hub.publish(conflict_pairs(alerted, timestamp), timestamp)
+
+    def setUp(self):
+        self.hub = AlertHub()
+        self.subscriber = self.hub.subscribe()
+        self.assertEqual(self.subscriber.get_nowait()['type'], 'snapshot')
+        delta = self.publish([('A', 'B', result(2, 5)), ('A', 'C', result(1, 2))], 0)
+        self.assertEqual([pair['callsigns'] for pair in delta['new']], [['A', 'B'], ['A', 'C']])
+
+    def test_steady_prediction_sends_nothing(self):
+        # 15 s later the conflicts are 0.25 min closer: the same clock times
+        self.assertIsNone(self.publish([('A', 'B', result(2, 4.75)), ('A', 'C', result(1, 1.75))], 15))
+        self.assertEqual(self.subscriber.qsize(), 1)
+
+    def test_partner_change_does_not_clear_other_pairs(self):
+        delta = self.publish([('A', 'B', result(2, 5)), ('B', 'D', result(1, 1))], 0)
+        self.assertEqual([pair['callsigns'] for pair in delta['new']], [['B', 'D']])
+        self.assertEqual(delta['updated'], [])
+        self.assertEqual(delta['cleared'], [['A', 'C']])
+
+    def test_level_change_is_an_update(self):
+        delta = self.publish([('A', 'B', result(1, 5)), ('A', 'C', result(1, 2))], 0)
+        self.assertEqual([(pair['callsigns'], pair['level']) for pair in delta['updated']], [(['A', 'B'], 'YELLOW')])
+
+    def test_drift_adds_up_to_an_update(self):
+        # Each cycle moves the conflict time by 20 s, within the tolerance,
+        # but against the last sent time the second one is past it
+        self.assertIsNone(self.publish([('A', 'B', result(2, 5 + 20 / 60)), ('A', 'C', result(1, 2))], 0))
+        delta = self.publish([('A', 'B', result(2, 5 + 40 / 60)), ('A', 'C', result(1, 2))], 0)
+        self.assertEqual([(pair['callsigns'], pair['conflict_time']) for pair in delta['updated']], [(['A', 'B'], 340)])
+        self.assertEqual(self.hub.snapshot()['pairs'][0]['conflict_time'], 340)
+        self.assertEqual([self.subscriber.get_nowait()['sequence'] for _ in range(2)], [1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+from unittest import mock
+
+from core.aircraft_table import AircraftTable
+from core.conflict_engine import cpa_conflicts, pair_status, step_conflicts
+from tests.traffic import route_entry
+
+
+def head_on_table(separation_nm, ground_speed):
+    # Two aircraft at FL350 on the same meridian, nose to nose, both on the
+    # first leg of their route
+    south, north = 38.0, 38.0 + separation_nm / 60
+    northbound = route_entry([('SOUTH', (36.0, -75.0)), ('NORTH', (42.0, -75.0)), ('FAR', (44.0, -75.0))])
+    southbound = route_entry([('NORTH', (42.0, -75.0)), ('SOUTH', (36.0, -75.0)), ('FAR', (34.0, -75.0))])
+    table = AircraftTable([
+        ('NORTH1', south, -75.0, 35000, ground_speed, 0, 'KAAA', 'KBBB', '', 35000),
+        ('SOUTH1', north, -75.0, 35000, ground_speed, 180, 'KBBB', 'KAAA', '', 35000),
+    ])
+    table.set_routes([northbound, southbound])
+    table.leg[:] = 0
+    table.deviation[:] = 0.0
+    return table
+
+
+class HeadOnBetweenSamplesTest(unittest.TestCase):
+    # 750 kt each way closes 25 NM a minute. From 62.5 NM apart the aircraft
+    # pass at 2.5 min and are 12.5 NM apart at both the 2 and 3 minute
+    # samples, outside every alert minimum.
+    def setUp(self):
+        self.table = head_on_table(62.5, 750)
+
+    def test_step_engine_misses_it(self):
+        self.assertEqual(step_conflicts(self.table, [0, 1]), [])
+
+    def test_cpa_engine_flags_it(self):
+        conflicts = cpa_conflicts(self.table, [0, 1])
+        self.assertEqual(len(conflicts), 1)
+
+        a, b, result = conflicts[0]
+        self.assertEqual({a, b}, {0, 1})
+        self.assertEqual(result['status'], 2)
+        # RED from 5 NM apart (57.5 NM closed), closest at the passing point
+        self.assertAlmostEqual(result['time_minutes_ahead'], 2.3, places=1)
+        self.assertAlmostEqual(result['cpa_time_minutes_ahead'], 2.5, places=1)
+        self.assertLess(result['cpa_distance_nm'], 0.5)
+
+    def test_pair_status_follows_the_engine(self):
+        with mock.patch('core.conflict_engine.CONFLICT_ENGINE', 'cpa'):
+            self.assertEqual(pair_status(self.table, 0, 1), 2)
+        with mock.patch('core.conflict_engine.CONFLICT_ENGINE', 'step'):
+            self.assertEqual(pair_status(self.table, 0, 1), 0)
+
+    def test_step_engine_sees_it_at_a_slower_closure(self):
+        # 16 NM a minute from 40 NM: 8 NM apart at the 2 and 3 minute samples
+        conflicts = step_conflicts(head_on_table(40.0, 480), [0, 1])
+        self.assertEqual([result['status'] for _, _, result in conflicts], [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
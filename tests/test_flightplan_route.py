@@ -0,0 +1,45 @@
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+import utils.faa as faa
+from core.flightplan_route import expand_route
+from utils.faa import AirwayGraph, NavdataResolver
+
+FIXES = pd.DataFrame({'FIX_ID': ['JERES', 'MOL', 'PAYGE', 'LITZA', 'BURNI'],
+                      'LAT_DECIMAL': [39.0, 37.9, 38.5, 38.9, 39.2],
+                      'LONG_DECIMAL': [-77.5, -79.1, -78.0, -78.6, -79.4]})
+AIRWAYS = pd.DataFrame({'AWY_ID': ['J48'], 'AIRWAY_STRING': ['JERES BURNI MOL']})
+
+
+class ExpandRouteTest(unittest.TestCase):
+    def setUp(self):
+        # The shipped tree has no APT table, so airports do not resolve
+        resolver = NavdataResolver([(FIXES, 'FIX_ID')])
+        for name, value in (('resolver', resolver), ('airways', AirwayGraph(AIRWAYS, resolver))):
+            patcher = mock.patch.object(faa, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def levels(self, route):
+        return [(name, altitude_ft) for name, _, altitude_ft in expand_route(route)]
+
+    def test_level_on_unresolved_point_moves_to_next_resolved(self):
+        self.assertEqual(self.levels('KIAD N0450F350 PAYGE LITZA KJFK'),
+                         [('PAYGE', 35000), ('LITZA', None)])
+        self.assertEqual(self.levels('KIAD/N0450F350 NOTAFIX PAYGE/N0450F370 LITZA'),
+                         [('PAYGE', 37000), ('LITZA', None)])
+
+    def test_level_before_airway_moves_to_entry_fix(self):
+        self.assertEqual(self.levels('KIAD N0450F330 JERES J48 MOL'),
+                         [('JERES', 33000), ('BURNI', None), ('MOL', None)])
+        self.assertEqual(self.levels('PAYGE J48/M082F390 MOL LITZA/K0830S1130'),
+                         [('PAYGE', 39000), ('MOL', None), ('LITZA', 11300 * 3.28084)])
+
+    def test_trailing_unresolved_level_is_dropped(self):
+        self.assertEqual(self.levels('PAYGE LITZA KJFK/N0300A050'), [('PAYGE', None), ('LITZA', None)])
+
+
+if __name__ == '__main__':
+    unittest.main()
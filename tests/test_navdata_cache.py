@@ -0,0 +1,92 @@
+import os
+import tempfile
+import unittest
+from datetime import date
+
+import pandas as pd
+
+from config import AWY_FILE, FILE_READ_MODE, NAV_FILE
+from utils.faa import AirwayGraph, NavdataResolver
+from utils.navdata_cache import NavdataCache, build_navdata_cache, load_faa_nasr_data
+
+
+def points(ids, first_lat, eff_date='2026/10/02'):
+    return pd.DataFrame({
+        'ID': ids,
+        'LAT_DECIMAL': [first_lat + i * 0.25 for i in range(len(ids))],
+        'LONG_DECIMAL': [-77.0 - i * 0.5 for i in range(len(ids))],
+        'EFF_DATE': [eff_date] * len(ids),
+    })
+
+
+def airways(rows):
+    return pd.DataFrame({'AWY_ID': [awy_id for awy_id, _ in rows],
+                         'AIRWAY_STRING': [airway_string for _, airway_string in rows],
+                         'EFF_DATE': ['2026/10/02'] * len(rows)})
+
+
+class NavdataCacheTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'navdata.bin')
+
+    def build(self, tables, awy):
+        build_navdata_cache(self.path, tables, awy)
+        resolver = NavdataResolver(tables)
+        return NavdataCache(self.path), resolver, AirwayGraph(awy, resolver)
+
+    def assert_same_navdata(self, cache, resolver, graph, idents):
+        idents = sorted(idents)
+        self.assertEqual([cache.resolve(ident) for ident in idents], [resolver.resolve(ident) for ident in idents])
+        self.assertEqual(cache.resolve_many(idents), resolver.resolve_many(idents))
+
+        self.assertEqual(cache.airway_ids(), sorted(graph.airway_ids()))
+        for awy_id in graph.airway_ids():
+            fix_ids = [fix_id for fix_id, _ in graph.segment(awy_id, None, None)]
+            self.assertEqual(cache.segment(awy_id, None, None), graph.segment(awy_id, None, None))
+            for from_fix, to_fix in ((fix_ids[0], fix_ids[-1]), (fix_ids[-1], fix_ids[0]),
+                                     (fix_ids[len(fix_ids) // 2], None), (None, fix_ids[len(fix_ids) // 2]),
+                                     (fix_ids[0].lower(), 'NOTAFIX')):
+                self.assertEqual(cache.segment(awy_id.lower(), from_fix, to_fix),
+                                 graph.segment(awy_id.lower(), from_fix, to_fix))
+
+    def test_matches_resolver_and_airway_graph(self):
+        fix = points(['ALPHA', 'BRAVO', 'CHRLY', 'DELTA', 'SHARE'], 38.0)
+        nav = points(['AB', 'SHARE', 'XYZ'], 40.0)
+        apt = points(['KIAD', 'XYZ', 'LONGERIDENT'], 41.0)
+        tables = [(fix.rename(columns={'ID': 'FIX_ID'}), 'FIX_ID'), (nav.rename(columns={'ID': 'NAV_ID'}), 'NAV_ID'),
+                  (apt.rename(columns={'ID': 'ARPT_ID'}), 'ARPT_ID')]
+        # J1 crosses a fix twice, J2 repeats in the table and Q3 names a fix
+        # that is in no table
+        awy = airways([('J1', 'ALPHA BRAVO AB CHRLY BRAVO DELTA'), ('J2', 'XYZ SHARE KIAD'),
+                       ('J2', 'ALPHA DELTA'), ('Q3', 'DELTA MISSING ALPHA')])
+
+        cache, resolver, graph = self.build(tables, awy)
+        self.assertEqual(cache.effective_date, date(2026, 10, 2))
+        # The first table listing an identifier wins
+        self.assertEqual(cache.resolve('SHARE'), (39.0, -79.0))
+        self.assertIsNone(cache.resolve('LONGERIDENTIFIER'))
+        self.assert_same_navdata(cache, resolver, graph,
+                                 ['ALPHA', 'BRAVO', 'CHRLY', 'DELTA', 'SHARE', 'AB', 'XYZ', 'KIAD', 'LONGERIDENT',
+                                  'MISSING', 'A', 'ZZZZZ', 'LONGERIDENTIFIER', ''])
+
+    def test_missing_tables(self):
+        cache, resolver, graph = self.build([(None, 'FIX_ID'), (None, 'NAV_ID')], None)
+        self.assertIsNone(cache.effective_date)
+        self.assertEqual(cache.resolve_many(['ALPHA', 'J1']), [None, None])
+        self.assertEqual(cache.airway_ids(), [])
+        self.assertEqual(cache.segment('J1', None, None), graph.segment('J1', None, None))
+
+    @unittest.skipUnless(os.path.exists(NAV_FILE) and os.path.exists(AWY_FILE), "NASR tables not present")
+    def test_shipped_nasr_tables(self):
+        nav = load_faa_nasr_data(NAV_FILE, FILE_READ_MODE)
+        awy = load_faa_nasr_data(AWY_FILE, FILE_READ_MODE)
+        cache, resolver, graph = self.build([(nav, 'NAV_ID')], awy)
+        idents = {ident for ident in nav['NAV_ID'] if isinstance(ident, str)}
+        idents |= {fix_id for airway_string in awy['AIRWAY_STRING'] for fix_id in airway_string.split(' ')}
+        self.assert_same_navdata(cache, resolver, graph, idents)
+
+
+if __name__ == '__main__':
+    unittest.main()
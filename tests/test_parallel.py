@@ -0,0 +1,31 @@
+import unittest
+
+import core.parallel as parallel
+from core.conflict_engine import cpa_conflicts
+from core.parallel import parallel_cpa_conflicts
+from tests.traffic import random_table
+
+
+def by_pair(pair_conflicts):
+    return {(min(a, b), max(a, b)): result for a, b, result in pair_conflicts}
+
+
+class ParallelCpaTest(unittest.TestCase):
+    def tearDown(self):
+        if parallel.executor is not None:
+            parallel.executor.shutdown()
+            parallel.executor = None
+
+    def test_matches_serial_engine_exactly(self):
+        table = random_table(2880, seed=1)
+        rows = list(range(0, len(table), 2)) + list(range(1, len(table), 2))
+        serial = by_pair(cpa_conflicts(table, rows))
+        self.assertGreater(len(serial), 500)
+        self.assertEqual(by_pair(parallel_cpa_conflicts(table, rows)), serial)
+
+    def test_no_rows(self):
+        self.assertEqual(parallel_cpa_conflicts(random_table(10), []), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+
+import numpy as np
+
+from core.collision import get_separation_array, get_status_array
+from core.conflict_engine import step_conflicts, step_times
+from core.position_prediction import predict_position_tensor
+from tests.traffic import random_table
+
+
+def every_pair_every_step(table, rows):
+    # The fixed-step loop the pruned engine replaced: every pair not yet in
+    # conflict is scored at every step, the first conflicting step wins
+    times = step_times()
+    positions = predict_position_tensor(table, rows, times)
+    deviations = table.deviation[rows]
+    first, second = np.triu_indices(len(rows), 1)
+    found = {}
+    for step, minutes in enumerate(times.tolist()):
+        statuses = get_status_array(*get_separation_array((*positions[first, step].T, deviations[first]),
+                                                          (*positions[second, step].T, deviations[second])))
+        for a, b, status in zip(first[statuses > 0].tolist(), second[statuses > 0].tolist(),
+                                statuses[statuses > 0].tolist()):
+            found.setdefault((rows[a], rows[b]), (status, minutes))
+    return found
+
+
+class StepEngineTest(unittest.TestCase):
+    def test_matches_every_pair_every_step(self):
+        for seed in (2, 3):
+            table = random_table(1000, seed=seed)
+            rows = list(range(len(table)))
+            expected = every_pair_every_step(table, rows)
+            self.assertGreater(len(expected), 150)
+            self.assertEqual({(a, b): (result['status'], result['time_minutes_ahead'])
+                              for a, b, result in step_conflicts(table, rows)}, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import json
+import unittest
+
+from core.vatsim_data_fetch import pilot_to_row, read_feed
+
+
+def pilot(callsign, route, remarks, **fields):
+    entry = {
+        'cid': 1000000,
+        'name': 'José Müller ✈ \U0001f6eb',
+        'callsign': callsign,
+        'latitude': 39.5,
+        'longitude': -77.25,
+        'altitude': 35000,
+        'groundspeed': 450,
+        'heading': 90,
+        'flight_plan': {'flight_rules': 'I', 'departure': 'KIAD', 'arrival': 'KJFK', 'altitude': '35000',
+                        'route': route, 'remarks': remarks},
+    }
+    entry.update(fields)
+    return entry
+
+
+FEED = {
+    'general': {'version': 3, 'update_timestamp': '2026-10-18T12:00:00.0000000Z',
+                'motd': 'quote " backslash \\ slash \\/ tab \t newline \n {not: [json]}'},
+    'controllers': [{'callsign': 'DC_CTR', 'text_atis': ['} ] , "', 'Été \\"quoted\\"']}],
+    'pilots': [
+        pilot('AAL1', 'DCT JERES J48 MOL', '/V/ PBN/A1B1 über "café"'),
+        pilot('UAL2', 'N0450F350 PAYGE Q68 LITZA', 'tab\there \\ back \u0000 nul 🚀'),
+        pilot('DAL3', 'DCT', 'low', altitude=5000),
+        pilot('SWA4', 'VFR', 'vfr', flight_plan={'flight_rules': 'V'}),
+        pilot('JBU5', '日本 DCT', 'no plan', flight_plan=None),
+        pilot('N123', 'DCT', 'ints', latitude=40, longitude=-75, altitude=12000, groundspeed=0, heading=None),
+    ],
+    'atis': [],
+    'prefiles': [{'callsign': 'X', 'flight_plan': {'route': '[[{{'}}],
+}
+
+
+def byte_chunks(data):
+    return (data[i:i + 1] for i in range(len(data)))
+
+
+def expected(data):
+    feed = json.loads(data)
+    rows = [pilot_to_row(entry) for entry in feed['pilots']]
+    return feed['general']['update_timestamp'], [row for row in rows if row is not None]
+
+
+class ReadFeedTest(unittest.TestCase):
+    def assert_matches_json(self, data):
+        update_timestamp, pilots = read_feed(byte_chunks(data))
+        self.assertEqual((update_timestamp, pilots), expected(data))
+        self.assertEqual([row[0] for row in pilots], ['AAL1', 'UAL2', 'N123'])
+
+    def test_one_byte_chunks_utf8(self):
+        self.assert_matches_json(json.dumps(FEED, ensure_ascii=False).encode('utf-8'))
+
+    def test_one_byte_chunks_ascii_escapes(self):
+        self.assert_matches_json(json.dumps(FEED).encode('utf-8'))
+
+    def test_one_byte_chunks_pilots_before_general(self):
+        feed = {'pilots': FEED['pilots'], 'controllers': FEED['controllers'], 'general': FEED['general']}
+        self.assert_matches_json(json.dumps(feed, ensure_ascii=False, indent=2).encode('utf-8'))
+
+    def test_unchanged_snapshot(self):
+        data = json.dumps(FEED, ensure_ascii=False).encode('utf-8')
+        self.assertEqual(read_feed(byte_chunks(data), FEED['general']['update_timestamp']),
+                         (FEED['general']['update_timestamp'], None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import random
+
+import numpy as np
+
+from core.aircraft_table import AircraftTable
+from core.route_segment import build_route_geometry
+from utils.great_circle import great_circle_destination
+
+
+def route_entry(waypoints):
+    return {
+        'waypoints': waypoints,
+        'coords': np.array([coords for _, coords in waypoints], dtype=float),
+        'geometry': build_route_geometry(waypoints),
+        'levels': np.full(len(waypoints), np.nan),
+    }
+
+
+def random_table(count, seed=0, centers=6):
+    # Busy synthetic traffic around a few hubs: every aircraft is on the first
+    # leg of a three-waypoint route through a turn, some climbing or
+    # descending towards their filed level
+    rnd = random.Random(seed)
+    hubs = [(rnd.uniform(33, 46), rnd.uniform(-120, -70)) for _ in range(centers)]
+    rows = []
+    entries = []
+    for k in range(count):
+        hub_lat, hub_lon = hubs[k % centers]
+        lat, lon = hub_lat + rnd.gauss(0, 2.0), hub_lon + rnd.gauss(0, 2.5)
+        heading = rnd.uniform(0, 360)
+        turn = heading + rnd.uniform(-60, 60)
+        start = great_circle_destination(lat, lon, heading + 180, rnd.uniform(5, 40))
+        middle = great_circle_destination(lat, lon, heading, rnd.uniform(10, 80))
+        end = great_circle_destination(*middle, turn, 150)
+        level = rnd.choice([28000, 30000, 32000, 34000, 36000])
+        altitude = level + rnd.choice([0, 0, 0, -4000, 3000])
+        rows.append((f'T{k}', lat, lon, altitude, rnd.randint(250, 520), heading, 'KAAA', 'KBBB', '', level))
+        entries.append(route_entry([('S', start), ('M', middle), ('E', end)]))
+
+    table = AircraftTable(rows)
+    table.set_routes(entries)
+    table.leg[:] = 0
+    table.deviation[:] = [rnd.uniform(0, 1.5) for _ in range(count)]
+    table.vertical_speed[:] = [0 if altitude == level else (1800 if altitude < level else -1500)
+                               for _, _, _, altitude, *_, level in rows]
+    return table
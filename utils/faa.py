@@ -1,75 +1,290 @@
-import pandas as pd
-from config import APT_FILE, FILE_READ_MODE, NAV_FILE, FIX_FILE, AWY_FILE
+import os
+import re
+import threading
+import time
+import traceback
+from datetime import date, datetime, timezone
+
+from config import APT_FILE, FILE_READ_MODE, NAV_FILE, FIX_FILE, AWY_FILE, NAVDATA_PATH, NAVDATA_CACHE_FILE, \
+    NAVDATA_CHECK_SECONDS
 from utils.great_circle import great_circle_destination
+from utils.navdata_cache import MAGIC as CACHE_MAGIC, NavdataCache, airway_segment, cache_effective_date, load_faa_nasr_data, \
+    table_effective_date
+
+
+class NavdataResolver:
+    def __init__(self, tables):
+        # tables are (DataFrame, id column) pairs in lookup precedence order
+        self.index = {}
+        for table, id_column in tables:
+            if table is None:
+                continue
+            for ident, lat, lon in zip(table[id_column], table['LAT_DECIMAL'], table['LONG_DECIMAL']):
+                if ident not in self.index:
+                    self.index[ident] = (float(lat), float(lon))
+
+    def resolve(self, ident):
+        return self.index.get(ident)
+
+    def resolve_many(self, idents):
+        get = self.index.get
+        return [get(ident) for ident in idents]
+
+
+class AirwayGraph:
+    def __init__(self, table, resolver):
+        # AWY_ID -> (fix ids, pre-resolved coordinates, fix id -> first position)
+        self.airways = {}
+        if table is None:
+            return
+        for awy_id, airway_string in zip(table['AWY_ID'], table['AIRWAY_STRING']):
+            if awy_id in self.airways:
+                continue
+            fix_ids = airway_string.split(' ')
+            positions = {}
+            for i, fix_id in enumerate(fix_ids):
+                positions.setdefault(fix_id, i)
+            self.airways[awy_id] = (fix_ids, resolver.resolve_many(fix_ids), positions)
+
+    def airway_ids(self):
+        return list(self.airways)
+
+    def segment(self, awy_id, from_fix, to_fix):
+        return airway_segment(self.airways.get(awy_id.upper()), from_fix, to_fix)
+
+
+# Fix/radial/distance point (ABC090025) and ICAO lat/lon literal (40N073W, 4030N07345W)
+FRD_PATTERN = re.compile(r"^([A-Z]{3})(\d{3})(\d{3})$")
+LAT_LON_PATTERN = re.compile(r"^(\d{2})(\d{2})?([NS])(\d{3})(\d{2})?([EW])$")
+# FRD point -> position, cleared whenever navdata is swapped
+frd_positions = {}
+
 
+def dataset_files(path):
+    # The NASR files of the dataset in directory path, named as in config
+    return [os.path.join(path, os.path.basename(file)) for file in (APT_FILE, NAV_FILE, FIX_FILE, AWY_FILE)]
 
-def load_faa_nasr_data(path, data_type):
-    if data_type == "feather":
-        return pd.read_feather(path)
-    elif data_type == "csv":
-        return pd.read_csv(path)
 
+def navdata_cache_is_current(cache_file, source_files):
+    # The compiled cache (python -m utils.navdata_cache) is used until any of
+    # the NASR files it was built from is newer than it
+    if not os.path.exists(cache_file):
+        return False
+    with open(cache_file, 'rb') as f:
+        if f.read(len(CACHE_MAGIC)) != CACHE_MAGIC:
+            return False
+    built = os.path.getmtime(cache_file)
+    return all(os.path.getmtime(path) <= built for path in source_files if os.path.exists(path))
+
+
+def dataset_effective_date(path):
+    # Cycle directories are named YYYY-MM-DD; otherwise the EFF_DATE recorded
+    # in an up-to-date cache, or read from the NAV or AWY table
+    try:
+        return date.fromisoformat(os.path.basename(os.path.normpath(path)))
+    except ValueError:
+        pass
+
+    cache_file = os.path.join(path, os.path.basename(NAVDATA_CACHE_FILE))
+    if navdata_cache_is_current(cache_file, dataset_files(path)):
+        effective_date = cache_effective_date(cache_file)
+        if effective_date is not None:
+            return effective_date
+
+    _, nav_file, _, awy_file = dataset_files(path)
+    for file in (nav_file, awy_file):
+        effective_date = table_effective_date(load_faa_nasr_data(file, FILE_READ_MODE, columns=['EFF_DATE']))
+        if effective_date is not None:
+            return effective_date
     return None
 
-apt = load_faa_nasr_data(APT_FILE, FILE_READ_MODE)
-nav = load_faa_nasr_data(NAV_FILE, FILE_READ_MODE)
-fix = load_faa_nasr_data(FIX_FILE, FILE_READ_MODE)
-awy = load_faa_nasr_data(AWY_FILE, FILE_READ_MODE)
 
-def deconstruct_awy(awy_id, from_fix, to_fix):
-    awy_id = awy_id.upper()
-    awy_row = awy[awy['AWY_ID'] == awy_id]
+def navdata_datasets():
+    # (effective date, directory) of NAVDATA_PATH and of every cycle directory in it
+    paths = [NAVDATA_PATH] + sorted(os.path.join(NAVDATA_PATH, name) for name in os.listdir(NAVDATA_PATH)
+                                    if os.path.isdir(os.path.join(NAVDATA_PATH, name)))
+    cache_name = os.path.basename(NAVDATA_CACHE_FILE)
+    return [(dataset_effective_date(path), path) for path in paths
+            if any(os.path.exists(file) for file in dataset_files(path))
+            or os.path.exists(os.path.join(path, cache_name))]
 
-    if awy_row.empty:
-        return []
 
-    waypoints = awy_row.iloc[0]['AIRWAY_STRING'].split(' ')
+def utc_date(now=None):
+    # UTC day of `now` (probe clock seconds), default the wall clock
+    return datetime.now(timezone.utc).date() if now is None else datetime.fromtimestamp(now, timezone.utc).date()
 
-    if from_fix:
-        from_fix = from_fix.upper()
-        if from_fix in waypoints:
-            start_index = waypoints.index(from_fix) + 1
-            waypoints = waypoints[start_index:]
-        else:
-            return []
 
-    if to_fix:
-        to_fix = to_fix.upper()
-        if to_fix in waypoints:
-            end_index = waypoints.index(to_fix)
-            waypoints = waypoints[:end_index]
+def dataset_in_effect(datasets, today):
+    # The dataset with the latest effective date on or before today, falling
+    # back to an undated one and then to the earliest
+    if not datasets:
+        return None, NAVDATA_PATH
+
+    effective = [dataset for dataset in datasets if dataset[0] is not None and dataset[0] <= today]
+    if effective:
+        return max(effective)
+    undated = [dataset for dataset in datasets if dataset[0] is None]
+    if undated:
+        return undated[0]
+    return min(datasets)
+
+
+def upcoming_dataset(datasets, today):
+    # The dated dataset that takes effect next after today, or None
+    upcoming = [dataset for dataset in datasets if dataset[0] is not None and dataset[0] > today]
+    return min(upcoming) if upcoming else None
+
+
+class Navdata:
+    # One loaded NASR cycle. Airway slices live on the resolver/graph, so they
+    # are dropped together with the dataset.
+    def __init__(self, path, effective_date):
+        self.path = path
+        self.effective_date = effective_date
+
+        apt_file, nav_file, fix_file, awy_file = dataset_files(path)
+        cache_file = os.path.join(path, os.path.basename(NAVDATA_CACHE_FILE))
+        if navdata_cache_is_current(cache_file, dataset_files(path)):
+            self.apt = self.nav = self.fix = self.awy = None
+            self.resolver = self.airways = NavdataCache(cache_file)
         else:
-            return []
+            self.apt = load_faa_nasr_data(apt_file, FILE_READ_MODE)
+            self.nav = load_faa_nasr_data(nav_file, FILE_READ_MODE)
+            self.fix = load_faa_nasr_data(fix_file, FILE_READ_MODE)
+            self.awy = load_faa_nasr_data(awy_file, FILE_READ_MODE)
 
-    return waypoints
+            self.resolver = NavdataResolver([(self.fix, 'FIX_ID'), (self.nav, 'NAV_ID'), (self.apt, 'ARPT_ID')])
+            self.airways = AirwayGraph(self.awy, self.resolver)
 
-def get_lat_lon(point):
-    import re
 
-    if re.match(r"^[A-Z]{3}\d{3}\d{3}$", point):
-        navaid = point[:3].upper()
+def install_navdata(navdata):
+    global apt, nav, fix, awy, resolver, airways, navdata_path, navdata_effective_date, navdata_version
+
+    apt, nav, fix, awy = navdata.apt, navdata.nav, navdata.fix, navdata.awy
+    resolver, airways = navdata.resolver, navdata.airways
+    navdata_path, navdata_effective_date = navdata.path, navdata.effective_date
+    # Bumped on every load so caches derived from navdata can tell they are stale
+    navdata_version += 1
+    frd_positions.clear()
+
+
+def reload_navdata(now=None):
+    global known_datasets
+
+    known_datasets = navdata_datasets()
+    effective_date, path = dataset_in_effect(known_datasets, utc_date(now))
+    install_navdata(Navdata(path, effective_date))
+
+
+# (effective date, directory) of every dataset found by the last scan; the
+# probe thread only selects among these and never touches the files
+known_datasets = []
+# A cycle loaded in the background, waiting for apply_pending_navdata
+pending_navdata = None
+pending_lock = threading.Lock()
+# Snapshot time of the last probe cycle, which the watcher selects against;
+# None until the first cycle, then the wall clock is used
+probe_clock = None
+
+
+def check_for_new_navdata(now=None):
+    # Rescans the datasets and loads the one the probe switches to next: the
+    # dataset in effect at `now` if it is not the active one, otherwise the
+    # next one to take effect, ahead of its effective date. Safe to call off
+    # the probe thread: nothing changes until apply_pending_navdata.
+    global known_datasets, pending_navdata
+
+    datasets = navdata_datasets()
+    today = utc_date(now)
+    selected = dataset_in_effect(datasets, today)
+    if selected == (navdata_effective_date, navdata_path):
+        selected = upcoming_dataset(datasets, today)
+    known_datasets = datasets
+
+    navdata = pending_navdata
+    if selected is None or (navdata is not None and (navdata.effective_date, navdata.path) == selected):
+        return False
+
+    navdata = Navdata(selected[1], selected[0])
+    with pending_lock:
+        pending_navdata = navdata
+    return True
 
-        lat_lon = get_lat_lon(navaid)
-        if lat_lon is None:
-            return None
-        lat, lon = lat_lon
 
-        radial_deg = int(point[3:6])
-        distance_nm = int(point[6:])
+def apply_pending_navdata(now=None):
+    # Makes the dataset in effect at `now`, the snapshot time of the coming
+    # probe cycle, the active one; call between probe cycles. Only the dates
+    # of the last scan are compared. The cycle the watcher preloaded is
+    # swapped in once it takes effect; one that was not preloaded, e.g. when a
+    # replay jumps between cycles, is loaded here. Returns True on a swap.
+    global pending_navdata, probe_clock
 
-        return great_circle_destination(lat, lon, radial_deg, distance_nm)
+    probe_clock = now
+    effective_date, path = dataset_in_effect(known_datasets, utc_date(now))
+    if effective_date == navdata_effective_date and path == navdata_path:
+        return False
+
+    with pending_lock:
+        navdata = pending_navdata
+        if navdata is not None and navdata.effective_date == effective_date and navdata.path == path:
+            pending_navdata = None
+        else:
+            navdata = None
+    if navdata is None:
+        navdata = Navdata(path, effective_date)
+
+    install_navdata(navdata)
+    return True
+
+
+def start_navdata_watcher(interval_seconds=NAVDATA_CHECK_SECONDS):
+    def watch():
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                check_for_new_navdata(probe_clock)
+            except Exception:
+                traceback.print_exc()
+
+    thread = threading.Thread(target=watch, daemon=True)
+    thread.start()
+    return thread
 
-    entry = fix[fix['FIX_ID'] == point]
 
-    if entry.empty:
-        entry = nav[nav['NAV_ID'] == point]
+navdata_version = 0
+navdata_path = None
+navdata_effective_date = None
+reload_navdata()
 
-    if entry.empty:
-        entry = apt[apt['ARPT_ID'] == point]
+def deconstruct_awy(awy_id, from_fix, to_fix):
+    return [fix_id for fix_id, _ in airways.segment(awy_id, from_fix, to_fix)]
 
-    if entry.empty:
+def parse_lat_lon(point):
+    # ICAO latitude/longitude literal: 40N073W or 4030N07345W
+    match = LAT_LON_PATTERN.match(point)
+    if match is None:
         return None
 
-    lat = entry.iloc[0]['LAT_DECIMAL']
-    lon = entry.iloc[0]['LONG_DECIMAL']
-    return lat, lon
\ No newline at end of file
+    lat_deg, lat_min, north_south, lon_deg, lon_min, east_west = match.groups()
+    lat = int(lat_deg) + int(lat_min or 0) / 60
+    lon = int(lon_deg) + int(lon_min or 0) / 60
+    return -lat if north_south == 'S' else lat, -lon if east_west == 'W' else lon
+
+def frd_lat_lon(point):
+    # Position of a fix/radial/distance point, memoized until navdata is swapped
+    if point not in frd_positions:
+        navaid, radial_deg, distance_nm = FRD_PATTERN.match(point).groups()
+        lat_lon = resolver.resolve(navaid)
+        frd_positions[point] = None if lat_lon is None else \
+            great_circle_destination(*lat_lon, int(radial_deg), int(distance_nm))
+    return frd_positions[point]
+
+def get_lat_lon(point):
+    if FRD_PATTERN.match(point):
+        return frd_lat_lon(point)
+
+    lat_lon = parse_lat_lon(point)
+    if lat_lon is not None:
+        return lat_lon
+
+    return resolver.resolve(point)
@@ -1,40 +1,37 @@
-from functools import cache
 import numpy as np
 
 from config import WAYPOINT_TOLERANCE_NM
 from utils.geo_constants import EARTH_RADIUS_NM
 
-@cache
 def deg2rad(deg):
     return deg * np.pi / 180.0
 
-@cache
 def nm_to_radians(nm):
     return nm * np.pi / 10800.0
 
-@cache
 def radians_to_nm(angle_rad):
     return angle_rad * (10800.0 / np.pi)
 
+def latlon_to_unit_array(lat_deg, lon_deg):
+    # Unit vectors on the sphere, shape (..., 3)
+    lat = deg2rad(np.asarray(lat_deg, dtype=float))
+    lon = deg2rad(np.asarray(lon_deg, dtype=float))
+    cos_lat = np.cos(lat)
+    return np.stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)), axis=-1)
+
 def latlon_to_unit(lat_deg, lon_deg):
-    lat = deg2rad(lat_deg)
-    lon = deg2rad(lon_deg)
-    x = np.cos(lat) * np.cos(lon)
-    y = np.cos(lat) * np.sin(lon)
-    z = np.sin(lat)
-    v = np.array([x, y, z], dtype=float)
-    return v / np.linalg.norm(v)
+    return latlon_to_unit_array(lat_deg, lon_deg)
 
 def angle_between(u, v):
     d = np.dot(u, v)
     d = max(-1.0, min(1.0, d))  # clamp numerical error
     return np.arccos(d)
 
-def great_circle_destination(lat, lon, bearing, distance_nm):
+def great_circle_destination_array(lat, lon, bearing, distance_nm):
     bearing_rad = np.radians(bearing)
     lat_rad = np.radians(lat)
     lon_rad = np.radians(lon)
-    distance_rad = distance_nm / EARTH_RADIUS_NM
+    distance_rad = np.asarray(distance_nm, dtype=float) / EARTH_RADIUS_NM
 
     new_lat_rad = np.arcsin(np.sin(lat_rad) * np.cos(distance_rad) +
                             np.cos(lat_rad) * np.sin(distance_rad) * np.cos(bearing_rad))
@@ -42,17 +39,18 @@ def great_circle_destination(lat, lon, bearing, distance_nm):
     new_lon_rad = lon_rad + np.arctan2(np.sin(bearing_rad) * np.sin(distance_rad) * np.cos(lat_rad),
                                        np.cos(distance_rad) - np.sin(lat_rad) * np.sin(new_lat_rad))
 
-    new_lat = np.degrees(new_lat_rad)
-    new_lon = np.degrees(new_lon_rad)
+    return np.degrees(new_lat_rad), np.degrees(new_lon_rad)
 
-    return new_lat, new_lon
+def great_circle_destination(lat, lon, bearing, distance_nm):
+    new_lat, new_lon = great_circle_destination_array(lat, lon, bearing, distance_nm)
+    return float(new_lat), float(new_lon)
 
 
-def haversine_distance(lat1, lon1, lat2, lon2):
+def haversine_distance_array(lat1, lon1, lat2, lon2):
     phi1 = np.radians(lat1)
     phi2 = np.radians(lat2)
-    delta_phi = np.radians(lat2 - lat1)
-    delta_lambda = np.radians(lon2 - lon1)
+    delta_phi = np.radians(np.subtract(lat2, lat1))
+    delta_lambda = np.radians(np.subtract(lon2, lon1))
 
     a = np.sin(delta_phi / 2.0) ** 2 + \
         np.cos(phi1) * np.cos(phi2) * \
@@ -61,41 +59,59 @@ def haversine_distance(lat1, lon1, lat2, lon2):
 
     return EARTH_RADIUS_NM * c
 
+def haversine_distance(lat1, lon1, lat2, lon2):
+    return float(haversine_distance_array(lat1, lon1, lat2, lon2))
+
+def distance_matrix(lats1, lons1, lats2=None, lons2=None):
+    # Pairwise great-circle distances (NM), shape (len(lats1), len(lats2))
+    lats1 = np.asarray(lats1, dtype=float)
+    lons1 = np.asarray(lons1, dtype=float)
+    lats2 = lats1 if lats2 is None else np.asarray(lats2, dtype=float)
+    lons2 = lons1 if lons2 is None else np.asarray(lons2, dtype=float)
+    return haversine_distance_array(lats1[:, None], lons1[:, None], lats2[None, :], lons2[None, :])
+
 WAYPOINT_TOLERANCE_RAD = nm_to_radians(WAYPOINT_TOLERANCE_NM)
 
+def arc_frames(u, w):
+    # In-plane normal v, arc extent delta and degenerate flag of the
+    # great-circle arcs between unit vectors u and w, shape (..., 3)
+    uw = np.sum(u * w, axis=-1)
+    v_raw = w - uw[..., None] * u
+    norm_v = np.linalg.norm(v_raw, axis=-1)
+    degenerate = norm_v < 1e-12
+    v = v_raw / np.where(degenerate, 1.0, norm_v)[..., None]
+    delta = np.arctan2(np.sum(w * v, axis=-1), uw) % (2 * np.pi)
+    return v, delta, degenerate
+
+def points_on_path_array(u, v, w, delta, degenerate, p):
+    # (in_arc, on_path, nm_dev) of unit vectors p against arcs with frames
+    # from arc_frames: in_arc when p projects inside the arc, on_path when it
+    # is also within the waypoint tolerance of it. on_path and nm_dev are only
+    # meaningful where in_arc is set. A degenerate arc matches near either end
+    # point.
+    A = np.sum(u * p, axis=-1)
+    B = np.sum(v * p, axis=-1)
+    theta_star = np.arctan2(B, A) % (2 * np.pi)
+    perp_angle = np.arccos(np.clip(np.hypot(A, B), -1.0, 1.0))
+
+    in_arc = theta_star <= delta
+    on_path = perp_angle <= WAYPOINT_TOLERANCE_RAD + 1e-12
+    nm_dev = radians_to_nm(perp_angle)
+
+    if np.any(degenerate):
+        near_start = np.arccos(np.clip(A, -1.0, 1.0)) <= WAYPOINT_TOLERANCE_RAD
+        near_end = np.arccos(np.clip(np.sum(w * p, axis=-1), -1.0, 1.0)) <= WAYPOINT_TOLERANCE_RAD
+        in_arc = in_arc | degenerate
+        on_path = np.where(degenerate, near_start | near_end, on_path)
+        nm_dev = np.where(degenerate, 0.0, nm_dev)
+
+    return in_arc, on_path, nm_dev
+
 def is_point_on_path(position_start, position_end, point):
-    u = latlon_to_unit(*position_start)
-    w = latlon_to_unit(*position_end)
-    p = latlon_to_unit(*point)
-
-    proj = np.dot(u, w) * u
-    v_raw = w - proj
-    norm_v = np.linalg.norm(v_raw)
-    if norm_v < 1e-12:
-        return (angle_between(u, p) <= WAYPOINT_TOLERANCE_RAD) or (angle_between(w, p) <= WAYPOINT_TOLERANCE_RAD), 0.0
-    v = v_raw / norm_v
-
-    A = np.dot(u, p)
-    B = np.dot(v, p)
-    C = np.hypot(A, B)
-    C = min(1.0, max(-1.0, C))
-
-    theta_star = np.arctan2(B, A)
-
-    Delta = np.arctan2(np.dot(w, v), np.dot(w, u))
-
-    norm2pi = lambda x: x % (2*np.pi)
-    th = norm2pi(theta_star)
-    d = norm2pi(Delta)
-
-    if d <= np.pi:
-        in_arc = (0 <= th <= d)
-    else:
-        in_arc = not (d < th < 2*np.pi)
-
-    if in_arc:
-        perp_angle = np.arccos(C)
-        nm_dist = radians_to_nm(perp_angle)
-        return perp_angle <= WAYPOINT_TOLERANCE_RAD + 1e-12, nm_dist
-    else:
-        return None
\ No newline at end of file
+    u = latlon_to_unit_array(*position_start)
+    w = latlon_to_unit_array(*position_end)
+    v, delta, degenerate = arc_frames(u, w)
+    in_arc, on_path, nm_dev = points_on_path_array(u, v, w, delta, degenerate, latlon_to_unit_array(*point))
+    if not in_arc:
+        return None
+    return bool(on_path), float(nm_dev)
@@ -0,0 +1,119 @@
+import codecs
+import json
+import re
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+# Strings, a string that is cut off at the end of the buffer, and brackets
+SKIP_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|"|[\[\]{}]')
+
+
+class JsonStream:
+    # Pull parser over an iterable of byte chunks. Walks the members of the
+    # top-level object and the elements of arrays without decoding the values
+    # the caller skips.
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.raw_decode = json.JSONDecoder().raw_decode
+        self.buf = ''
+        self.pos = 0
+        self.exhausted = False
+
+    def fill(self):
+        if self.exhausted:
+            return False
+        if self.pos > 0:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        for chunk in self.chunks:
+            text = self.utf8.decode(chunk)
+            if text:
+                self.buf += text
+                return True
+        self.buf += self.utf8.decode(b'', final=True)
+        self.exhausted = True
+        return False
+
+    def peek(self):
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                raise ValueError("Unexpected end of JSON stream")
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at stream offset {self.pos}")
+        self.pos += 1
+
+    def decode_value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+            # A number or literal that ends with the buffer may continue in the next chunk
+            if end == len(self.buf) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+    def skip_value(self):
+        if self.peek() not in '[{':
+            self.decode_value()
+            return
+
+        depth = 0
+        while True:
+            match = SKIP_TOKEN.search(self.buf, self.pos)
+            if match is None or match.group() == '"':
+                if match is not None:
+                    self.pos = match.start()
+                else:
+                    self.pos = len(self.buf)
+                if not self.fill():
+                    raise ValueError("Unexpected end of JSON stream")
+                continue
+
+            self.pos = match.end()
+            token = match.group()
+            if token in '[{':
+                depth += 1
+            elif token in ']}':
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def members(self):
+        # Yields the keys of an object; the caller must consume each value
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.decode_value()
+            self.expect(':')
+            yield key
+            if self.peek() == ',':
+                self.pos += 1
+                continue
+            self.expect('}')
+            return
+
+    def values(self):
+        # Yields the decoded elements of an array one at a time
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.decode_value()
+            if self.peek() == ',':
+                self.pos += 1
+                continue
+            self.expect(']')
+            return
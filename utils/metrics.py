@@ -0,0 +1,157 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import METRICS_LOG_FILE
+
+PREFIX = 'conflict_probe'
+
+
+class CycleMetrics:
+    # Wall time per stage and counters for one get_aircraft_conflict_status cycle
+    def __init__(self, now):
+        self.now = now
+        self.stages = {}
+        self.counters = {}
+
+    def add_time(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def as_dict(self):
+        return {
+            'time': self.now,
+            'stages': {stage: round(seconds, 6) for stage, seconds in self.stages.items()},
+            'total': round(sum(self.stages.values()), 6),
+            'counters': dict(self.counters),
+        }
+
+
+# The cycle being recorded; timer() and count() are no-ops outside a cycle
+current = None
+last_cycle = None
+cycles_total = 0
+stage_seconds_total = {}
+counters_total = {}
+lock = threading.Lock()
+
+
+def start_cycle(now):
+    global current
+    current = CycleMetrics(now)
+    return current
+
+
+def finish_cycle():
+    global current, last_cycle, cycles_total
+    cycle, current = current, None
+    if cycle is None:
+        return None
+
+    with lock:
+        last_cycle = cycle
+        cycles_total += 1
+        for stage, seconds in cycle.stages.items():
+            stage_seconds_total[stage] = stage_seconds_total.get(stage, 0.0) + seconds
+        for name, value in cycle.counters.items():
+            counters_total[name] = counters_total.get(name, 0) + value
+
+    if METRICS_LOG_FILE:
+        with open(METRICS_LOG_FILE, 'a') as f:
+            f.write(json.dumps(cycle.as_dict()) + '\n')
+    return cycle
+
+
+@contextmanager
+def timer(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if current is not None:
+            current.add_time(stage, time.perf_counter() - start)
+
+
+def timed_iter(iterable, producer_stage, consumer_stage):
+    # Splits iteration time between producing each item (e.g. waiting on the
+    # network) and whatever the caller does with it before asking for the next
+    mark = time.perf_counter()
+    for item in iterable:
+        now = time.perf_counter()
+        if current is not None:
+            current.add_time(producer_stage, now - mark)
+        yield item
+        mark = time.perf_counter()
+        if current is not None:
+            current.add_time(consumer_stage, mark - now)
+
+
+def count(name, value=1):
+    if current is not None:
+        current.count(name, value)
+
+
+def prometheus_text():
+    with lock:
+        cycle = last_cycle
+        lines = [
+            f'# HELP {PREFIX}_cycles_total Completed probe cycles.',
+            f'# TYPE {PREFIX}_cycles_total counter',
+            f'{PREFIX}_cycles_total {cycles_total}',
+            f'# HELP {PREFIX}_stage_seconds_total Wall time spent in each stage over all cycles.',
+            f'# TYPE {PREFIX}_stage_seconds_total counter',
+        ]
+        lines += [f'{PREFIX}_stage_seconds_total{{stage="{stage}"}} {seconds:.6f}'
+                  for stage, seconds in sorted(stage_seconds_total.items())]
+        lines += [f'# HELP {PREFIX}_events_total Counter totals over all cycles.',
+                  f'# TYPE {PREFIX}_events_total counter']
+        lines += [f'{PREFIX}_events_total{{counter="{name}"}} {value}' for name, value in sorted(counters_total.items())]
+
+    if cycle is not None:
+        lines += [f'# HELP {PREFIX}_last_stage_seconds Wall time of each stage in the last cycle.',
+                  f'# TYPE {PREFIX}_last_stage_seconds gauge']
+        lines += [f'{PREFIX}_last_stage_seconds{{stage="{stage}"}} {seconds:.6f}'
+                  for stage, seconds in sorted(cycle.stages.items())]
+        lines += [f'# HELP {PREFIX}_last_cycle Counter values of the last cycle.',
+                  f'# TYPE {PREFIX}_last_cycle gauge']
+        lines += [f'{PREFIX}_last_cycle{{counter="{name}"}} {value}' for name, value in sorted(cycle.counters.items())]
+        lines += [f'# HELP {PREFIX}_last_cycle_timestamp_seconds Clock of the last cycle.',
+                  f'# TYPE {PREFIX}_last_cycle_timestamp_seconds gauge',
+                  f'{PREFIX}_last_cycle_timestamp_seconds {cycle.now}']
+
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/metrics':
+            body = prometheus_text().encode()
+            content_type = 'text/plain; version=0.0.4'
+        elif self.path == '/metrics.json':
+            with lock:
+                cycle = last_cycle
+            body = json.dumps(cycle.as_dict() if cycle is not None else None).encode()
+            content_type = 'application/json'
+        else:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host='127.0.0.1'):
+    # Serves /metrics (Prometheus text) and /metrics.json (last cycle) from a daemon thread
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
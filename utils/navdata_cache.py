@@ -0,0 +1,203 @@
+import mmap
+import os
+import struct
+import sys
+from datetime import date, datetime
+
+import numpy as np
+
+# magic, effective date (proleptic ordinal, 0 if unknown), identifier count,
+# identifier width, airway count, airway id width, airway fix count, airway fix width
+HEADER = struct.Struct('<4s7q')
+MAGIC = b'NAV2'
+
+
+def load_faa_nasr_data(path, data_type, columns=None):
+    # FIX and APT tables are not always shipped, a missing file is an empty table
+    if not os.path.exists(path):
+        return None
+
+    import pandas as pd
+
+    if data_type == "feather":
+        return pd.read_feather(path, columns=columns)
+    elif data_type == "csv":
+        return pd.read_csv(path, usecols=columns)
+
+    return None
+
+
+def airway_segment(airway, from_fix, to_fix):
+    # Fixes strictly between from_fix and to_fix, in the direction of travel.
+    # airway is (fix ids, pre-resolved coordinates, fix id -> first position).
+    if airway is None:
+        return []
+    fix_ids, coordinates, positions = airway
+
+    start = 0
+    end = len(fix_ids) - 1
+    if from_fix:
+        start = positions.get(from_fix.upper())
+        if start is None:
+            return []
+    if to_fix:
+        end = positions.get(to_fix.upper())
+        if end is None:
+            return []
+
+    if from_fix and to_fix and end < start:
+        return list(zip(fix_ids[start - 1:end:-1], coordinates[start - 1:end:-1]))
+
+    first = start + 1 if from_fix else start
+    last = end if to_fix else end + 1
+    return list(zip(fix_ids[first:last], coordinates[first:last]))
+
+
+def fixed_width(strings):
+    encoded = [s.encode() for s in strings]
+    width = max([len(s) for s in encoded] + [1])
+    return np.array(encoded, dtype=f'S{width}')
+
+
+def table_effective_date(table):
+    if table is None or 'EFF_DATE' not in table or not len(table):
+        return None
+    return datetime.strptime(table['EFF_DATE'].iloc[0], '%Y/%m/%d').date()
+
+
+def cache_effective_date(path):
+    # Effective date stored in a cache file's header, without mapping the file
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+    if len(header) < HEADER.size or header[:4] != MAGIC:
+        return None
+    ordinal = HEADER.unpack(header)[1]
+    return date.fromordinal(ordinal) if ordinal else None
+
+
+def build_navdata_cache(path, tables, awy):
+    # tables are (DataFrame, id column) pairs in lookup precedence order, awy
+    # is the airway table. Written to a temporary file and swapped in so
+    # processes that have the old file mapped keep a consistent view.
+    effective_date = next((table_effective_date(table) for table in [awy] + [table for table, _ in tables]
+                           if table_effective_date(table) is not None), None)
+
+    coordinates = {}
+    for table, id_column in tables:
+        if table is None:
+            continue
+        for ident, lat, lon in zip(table[id_column], table['LAT_DECIMAL'], table['LONG_DECIMAL']):
+            if isinstance(ident, str) and ident not in coordinates:
+                coordinates[ident] = (float(lat), float(lon))
+
+    airways = {}
+    if awy is not None:
+        for awy_id, airway_string in zip(awy['AWY_ID'], awy['AIRWAY_STRING']):
+            if awy_id not in airways:
+                airways[awy_id] = airway_string.split(' ')
+
+    idents = fixed_width(sorted(coordinates))
+    coords = np.array([coordinates[ident] for ident in sorted(coordinates)], dtype='<f8').reshape(-1, 2)
+    awy_ids = fixed_width(sorted(airways))
+    fix_names = fixed_width([fix_id for awy_id in sorted(airways) for fix_id in airways[awy_id]])
+    offsets = np.concatenate(([0], np.cumsum([len(airways[awy_id]) for awy_id in sorted(airways)]))).astype('<i8')
+
+    header = HEADER.pack(MAGIC, effective_date.toordinal() if effective_date else 0, len(idents), idents.itemsize, len(awy_ids), awy_ids.itemsize,
+                         len(fix_names), fix_names.itemsize)
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as f:
+        f.write(header)
+        for section in (idents, coords, awy_ids, offsets, fix_names):
+            data = section.tobytes()
+            f.write(data + b'\0' * (-len(data) % 8))
+    os.replace(temporary_path, path)
+
+
+class NavdataCache:
+    # Read-only view of a file written by build_navdata_cache. Sections are
+    # numpy views over one mmap, so pages are only read when a lookup touches
+    # them and every process mapping the file shares them.
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, ordinal, n, width, m, awy_width, k, fix_width = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a navdata cache file")
+        self.effective_date = date.fromordinal(ordinal) if ordinal else None
+
+        self.offset = HEADER.size
+        self.idents = self.section(f'S{width}', n)
+        self.coordinates = self.section('<f8', n * 2).reshape(n, 2)
+        self.awy_ids = self.section(f'S{awy_width}', m)
+        self.awy_offsets = self.section('<i8', m + 1)
+        self.fix_names = self.section(f'S{fix_width}', k)
+        # AWY_ID -> (fix ids, pre-resolved coordinates, fix id -> first position),
+        # filled the first time each airway is used
+        self.airways = {}
+
+    def section(self, dtype, count):
+        array = np.frombuffer(self.buffer, dtype=dtype, count=count, offset=self.offset)
+        self.offset += array.nbytes + (-array.nbytes % 8)
+        return array
+
+    def find(self, table, key):
+        key = key.encode()
+        if len(key) > table.itemsize:
+            return -1
+        i = int(np.searchsorted(table, key))
+        if i < len(table) and table[i] == key:
+            return i
+        return -1
+
+    def resolve(self, ident):
+        i = self.find(self.idents, ident)
+        if i < 0:
+            return None
+        lat, lon = self.coordinates[i].tolist()
+        return lat, lon
+
+    def resolve_many(self, idents):
+        if not idents or not len(self.idents):
+            return [None] * len(idents)
+
+        keys = fixed_width(idents)
+        found = np.minimum(np.searchsorted(self.idents, keys), len(self.idents) - 1)
+        matched = (self.idents[found] == keys) & (np.char.str_len(keys) <= self.idents.itemsize)
+        coordinates = self.coordinates[found].tolist()
+        return [tuple(coords) if match else None for coords, match in zip(coordinates, matched.tolist())]
+
+    def airway(self, awy_id):
+        airway = self.airways.get(awy_id)
+        if airway is None:
+            i = self.find(self.awy_ids, awy_id)
+            if i < 0:
+                return None
+            fix_ids = [name.decode() for name in self.fix_names[self.awy_offsets[i]:self.awy_offsets[i + 1]].tolist()]
+            positions = {}
+            for position, fix_id in enumerate(fix_ids):
+                positions.setdefault(fix_id, position)
+            airway = self.airways[awy_id] = (fix_ids, self.resolve_many(fix_ids), positions)
+        return airway
+
+    def airway_ids(self):
+        return [awy_id.decode() for awy_id in self.awy_ids.tolist()]
+
+    def segment(self, awy_id, from_fix, to_fix):
+        return airway_segment(self.airway(awy_id.upper()), from_fix, to_fix)
+
+
+if __name__ == "__main__":
+    # python -m utils.navdata_cache [dataset directory], default NAVDATA_PATH
+    from config import APT_FILE, FILE_READ_MODE, NAV_FILE, FIX_FILE, AWY_FILE, NAVDATA_PATH, NAVDATA_CACHE_FILE
+
+    dataset = sys.argv[1] if len(sys.argv) > 1 else NAVDATA_PATH
+    apt_file, nav_file, fix_file, awy_file = (os.path.join(dataset, os.path.basename(file))
+                                              for file in (APT_FILE, NAV_FILE, FIX_FILE, AWY_FILE))
+    output_path = os.path.join(dataset, os.path.basename(NAVDATA_CACHE_FILE))
+    build_navdata_cache(output_path,
+                        [(load_faa_nasr_data(fix_file, FILE_READ_MODE), 'FIX_ID'),
+                         (load_faa_nasr_data(nav_file, FILE_READ_MODE), 'NAV_ID'),
+                         (load_faa_nasr_data(apt_file, FILE_READ_MODE), 'ARPT_ID')],
+                        load_faa_nasr_data(awy_file, FILE_READ_MODE))
+    print(f"Wrote navdata cache to {output_path}")
@@ -0,0 +1,87 @@
+import math
+from collections import defaultdict
+
+NM_PER_DEG_LAT = 60.0
+
+
+def padded_box(lats, lons, alts, lateral_pad_nm, vertical_pad_ft):
+    min_lat, max_lat = min(lats), max(lats)
+    max_abs_lat = min(89.0, max(abs(min_lat), abs(max_lat)) + lateral_pad_nm / NM_PER_DEG_LAT)
+    lat_pad = lateral_pad_nm / NM_PER_DEG_LAT
+    lon_pad = lateral_pad_nm / (NM_PER_DEG_LAT * math.cos(math.radians(max_abs_lat)))
+    return (min_lat - lat_pad, min(lons) - lon_pad, max_lat + lat_pad, max(lons) + lon_pad,
+            min(alts) - vertical_pad_ft, max(alts) + vertical_pad_ft)
+
+
+def boxes_overlap(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3] and a[4] <= b[5] and b[4] <= a[5]
+
+
+def candidate_pairs(boxes, cell_nm, band_ft):
+    # Buckets (min_lat, min_lon, max_lat, max_lon, min_alt, max_alt) boxes into
+    # a lat/lon/altitude-band grid and returns the (i, j), i < j, index pairs
+    # whose boxes overlap. Boxes that are None are never paired.
+    present = [box for box in boxes if box is not None]
+    if not present:
+        return []
+
+    max_abs_lat = min(89.0, max(max(abs(box[0]), abs(box[2])) for box in present))
+    cell_lat = cell_nm / NM_PER_DEG_LAT
+    cell_lon = cell_nm / (NM_PER_DEG_LAT * math.cos(math.radians(max_abs_lat)))
+
+    grid = defaultdict(list)
+    for index, box in enumerate(boxes):
+        if box is None:
+            continue
+        for row in range(math.floor(box[0] / cell_lat), math.floor(box[2] / cell_lat) + 1):
+            for col in range(math.floor(box[1] / cell_lon), math.floor(box[3] / cell_lon) + 1):
+                for band in range(math.floor(box[4] / band_ft), math.floor(box[5] / band_ft) + 1):
+                    grid[(row, col, band)].append(index)
+
+    pairs = set()
+    for members in grid.values():
+        for a in range(len(members)):
+            for b in range(a + 1, len(members)):
+                pairs.add((members[a], members[b]))
+
+    return sorted(pair for pair in pairs if boxes_overlap(boxes[pair[0]], boxes[pair[1]]))
+
+
+class SpatialGrid:
+    # Persistent version of candidate_pairs for boxes that change one at a
+    # time. The longitude cell width is fixed from max_abs_lat, which must
+    # bound every box that is inserted.
+    def __init__(self, cell_nm, band_ft, max_abs_lat):
+        self.cell_lat = cell_nm / NM_PER_DEG_LAT
+        self.cell_lon = cell_nm / (NM_PER_DEG_LAT * math.cos(math.radians(min(89.0, max_abs_lat))))
+        self.band_ft = band_ft
+        self.cells = defaultdict(set)
+        self.boxes = {}
+
+    def box_cells(self, box):
+        return [(row, col, band)
+                for row in range(math.floor(box[0] / self.cell_lat), math.floor(box[2] / self.cell_lat) + 1)
+                for col in range(math.floor(box[1] / self.cell_lon), math.floor(box[3] / self.cell_lon) + 1)
+                for band in range(math.floor(box[4] / self.band_ft), math.floor(box[5] / self.band_ft) + 1)]
+
+    def remove(self, key):
+        box = self.boxes.pop(key, None)
+        if box is None:
+            return
+        for cell in self.box_cells(box):
+            members = self.cells[cell]
+            members.discard(key)
+            if not members:
+                del self.cells[cell]
+
+    def insert(self, key, box):
+        # Replaces key's box and returns the keys whose boxes now overlap it
+        self.remove(key)
+        self.boxes[key] = box
+        neighbors = set()
+        for cell in self.box_cells(box):
+            members = self.cells[cell]
+            neighbors.update(members)
+            members.add(key)
+        neighbors.discard(key)
+        return {other for other in neighbors if boxes_overlap(box, self.boxes[other])}
@@ -0,0 +1,94 @@
+import json
+import random
+import sys
+from datetime import datetime, timezone
+
+import utils.faa as faa
+from config import BOTTOM_LEFT_LIMIT, TOP_RIGHT_LIMIT
+from core.position_prediction import track_between_points
+from utils.great_circle import great_circle_destination, haversine_distance
+
+AIRPORTS = ('KATL', 'KBOS', 'KCLT', 'KDEN', 'KDFW', 'KIAD', 'KJFK', 'KLAX', 'KMIA', 'KORD', 'KSEA', 'KSFO')
+HIGH_LEVELS = tuple(range(24000, 41001, 1000))
+LOW_LEVELS = tuple(range(11000, 17001, 1000))
+
+
+def inside_limits(coords):
+    return BOTTOM_LEFT_LIMIT[0] <= coords[0] <= TOP_RIGHT_LIMIT[0] and BOTTOM_LEFT_LIMIT[1] <= coords[1] <= TOP_RIGHT_LIMIT[1]
+
+
+def airway_legs():
+    # (airway id, resolved fixes) for every airway with at least two
+    # consecutive resolved fixes inside the configured lat/lon limits
+    legs = []
+    for awy_id in faa.airways.airway_ids():
+        fixes = [(fix_id, coords) for fix_id, coords in faa.airways.segment(awy_id, None, None) if coords]
+        if len(fixes) >= 3 and any(inside_limits(a[1]) and inside_limits(b[1]) for a, b in zip(fixes, fixes[1:])):
+            legs.append((awy_id, fixes))
+    return legs
+
+
+def format_timestamp(timestamp):
+    return timestamp.strftime('%Y-%m-%dT%H:%M:%S.%f') + '0Z'
+
+
+def generate_feed(count, seed=0, update_timestamp=None, legs=None):
+    # VATSIM v3 feed with count IFR pilots flying filed airways between their
+    # first and last resolved fixes, 20% of them still climbing to cruise
+    rnd = random.Random(seed)
+    if legs is None:
+        legs = airway_legs()
+    if update_timestamp is None:
+        update_timestamp = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+    pilots = []
+    while len(pilots) < count:
+        awy_id, fixes = legs[rnd.randrange(len(legs))]
+        if rnd.random() < 0.5:
+            fixes = fixes[::-1]
+
+        i = rnd.randrange(len(fixes) - 1)
+        (_, start), (_, end) = fixes[i], fixes[i + 1]
+        if not (inside_limits(start) and inside_limits(end)):
+            continue
+
+        track = float(track_between_points(*start, *end)) % 360
+        lat, lon = great_circle_destination(*start, track, rnd.random() * haversine_distance(*start, *end))
+        cruising_altitude = rnd.choice(HIGH_LEVELS if awy_id[0] in 'JQ' else LOW_LEVELS)
+        altitude = cruising_altitude - (rnd.randrange(1000, 5000, 100) if rnd.random() < 0.2 else 0)
+
+        k = len(pilots)
+        pilots.append({
+            'cid': 1000000 + k,
+            'callsign': f'SYN{k}',
+            'latitude': round(lat, 5),
+            'longitude': round(lon, 5),
+            'altitude': altitude,
+            'groundspeed': rnd.randint(250, 500) if cruising_altitude >= 24000 else rnd.randint(180, 300),
+            'heading': int(track),
+            'flight_plan': {
+                'flight_rules': 'I',
+                'departure': rnd.choice(AIRPORTS),
+                'arrival': rnd.choice(AIRPORTS),
+                'altitude': str(cruising_altitude),
+                'route': f'{fixes[0][0]} {awy_id} {fixes[-1][0]}',
+            },
+        })
+
+    return {
+        'general': {'version': 3, 'update_timestamp': format_timestamp(update_timestamp),
+                    'connected_clients': count, 'unique_users': count},
+        'pilots': pilots,
+        'controllers': [],
+        'atis': [],
+        'servers': [],
+        'prefiles': [],
+    }
+
+
+if __name__ == "__main__":
+    # python -m utils.synthetic_feed <aircraft> <output.json> [seed]
+    count = int(sys.argv[1])
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    with open(sys.argv[2], 'w') as f:
+        json.dump(generate_feed(count, seed), f)
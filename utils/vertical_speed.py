@@ -1,47 +1,146 @@
-import json
+import atexit
 import os
+import struct
 import time
-from config import VERTICAL_SPEED_CACHE_FILE
+from collections import deque
 
+from config import VERTICAL_SPEED_CACHE_FILE, VERTICAL_SPEED_SAMPLES, VERTICAL_SPEED_TTL_SECONDS, \
+    VERTICAL_SPEED_SNAPSHOT_SECONDS
 
-def batch_compute_vertical_speed(aircraft_list):
-    dirpath = os.path.dirname(VERTICAL_SPEED_CACHE_FILE)
-    if dirpath:
-        os.makedirs(dirpath, exist_ok=True)
+SNAPSHOT_MAGIC = b'VSP1'
+SAMPLE_FORMAT = struct.Struct('<di')
 
-    if os.path.exists(VERTICAL_SPEED_CACHE_FILE):
-        with open(VERTICAL_SPEED_CACHE_FILE, 'r') as f:
-            data = json.load(f)
-    else:
-        data = {}
 
-    for aircraft in aircraft_list:
-        new_data, vertical_speed = compute_vertical_speed(aircraft['callsign'], aircraft['altitude'], data)
-        aircraft['vertical_speed'] = vertical_speed
-        data = new_data
+class VerticalSpeedTracker:
+    def __init__(self, path, samples, ttl_seconds, snapshot_seconds):
+        self.path = path
+        self.samples = samples
+        self.ttl_seconds = ttl_seconds
+        self.snapshot_seconds = snapshot_seconds
+        # callsign -> ring buffer of (timestamp, altitude)
+        self.tracks = {}
+        self.last_snapshot = None
+        # The snapshot is read on the first update, and only a tracker that
+        # has been updated writes one back
+        self.restored = False
+        self.updated = False
 
-    with open(VERTICAL_SPEED_CACHE_FILE, 'w') as f:
-        json.dump(data, f)
+    def update(self, callsign, altitude, now):
+        if not self.restored:
+            self.restore(now)
+        self.updated = True
 
-    return aircraft_list
+        track = self.tracks.get(callsign)
+        if track is None:
+            track = deque(maxlen=self.samples)
+            self.tracks[callsign] = track
+        elif track and now - track[-1][0] >= self.ttl_seconds:
+            track.clear()
 
+        if not track or now > track[-1][0]:
+            track.append((now, altitude))
 
-def compute_vertical_speed(callsign, current_altitude, data):
-    now = time.time()
-    prev = data.get(callsign)
-    vertical_speed = 0
+        return self.vertical_speed(track)
 
-    if prev:
-        prev_altitude = prev['altitude']
-        prev_time = prev['timestamp']
-        time_diff = now - prev_time
-        if 0 < time_diff < 600:
-            vertical_speed = ((current_altitude - prev_altitude) / time_diff) * 60
-            vertical_speed = int(vertical_speed)
+    def vertical_speed(self, track):
+        # Least-squares climb/descent rate over the buffered samples, in ft/min
+        if len(track) < 2:
+            return 0
 
-    data[callsign] = {
-        'altitude': current_altitude,
-        'timestamp': now
-    }
+        n = len(track)
+        mean_t = sum(t for t, _ in track) / n
+        mean_alt = sum(alt for _, alt in track) / n
+        var_t = sum((t - mean_t) ** 2 for t, _ in track)
+        if var_t <= 0:
+            return 0
 
-    return data, vertical_speed
\ No newline at end of file
+        slope = sum((t - mean_t) * (alt - mean_alt) for t, alt in track) / var_t
+        return int(slope * 60)
+
+    def evict(self, now):
+        stale = [callsign for callsign, track in self.tracks.items()
+                 if not track or now - track[-1][0] >= self.ttl_seconds]
+        for callsign in stale:
+            del self.tracks[callsign]
+
+    def maybe_snapshot(self, now):
+        if self.last_snapshot is None:
+            self.last_snapshot = now
+        elif now - self.last_snapshot >= self.snapshot_seconds:
+            self.snapshot()
+            self.last_snapshot = now
+
+    def snapshot(self):
+        if self.path is None:
+            return
+
+        dirpath = os.path.dirname(self.path)
+        if dirpath:
+            os.makedirs(dirpath, exist_ok=True)
+
+        chunks = [SNAPSHOT_MAGIC, struct.pack('<I', len(self.tracks))]
+        for callsign, track in self.tracks.items():
+            name = callsign.encode('utf-8')[:255]
+            chunks.append(struct.pack('<BB', len(name), len(track)))
+            chunks.append(name)
+            for timestamp, altitude in track:
+                chunks.append(SAMPLE_FORMAT.pack(timestamp, int(altitude)))
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(b''.join(chunks))
+        os.replace(tmp_path, self.path)
+
+    def restore(self, now):
+        self.restored = True
+        if self.path is None or not os.path.exists(self.path):
+            return
+
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        if data[:4] != SNAPSHOT_MAGIC:
+            return
+
+        try:
+            (count,) = struct.unpack_from('<I', data, 4)
+            offset = 8
+            for _ in range(count):
+                name_len, sample_count = struct.unpack_from('<BB', data, offset)
+                offset += 2
+                callsign = data[offset:offset + name_len].decode('utf-8')
+                offset += name_len
+                track = deque(maxlen=self.samples)
+                for _ in range(sample_count):
+                    track.append(SAMPLE_FORMAT.unpack_from(data, offset))
+                    offset += SAMPLE_FORMAT.size
+                self.tracks[callsign] = track
+        except (struct.error, UnicodeDecodeError):
+            self.tracks.clear()
+            return
+
+        self.evict(now)
+
+
+tracker = VerticalSpeedTracker(VERTICAL_SPEED_CACHE_FILE, VERTICAL_SPEED_SAMPLES, VERTICAL_SPEED_TTL_SECONDS,
+                               VERTICAL_SPEED_SNAPSHOT_SECONDS)
+
+
+def snapshot_at_exit():
+    # Looked up at exit so a tracker swapped in later (benchmarks, replay) is the one saved
+    if tracker.updated:
+        tracker.snapshot()
+
+
+atexit.register(snapshot_at_exit)
+
+
+def batch_compute_vertical_speed(table, now=None):
+    if now is None:
+        now = time.time()
+
+    for i, (callsign, altitude) in enumerate(zip(table.callsigns, table.altitude.tolist())):
+        table.vertical_speed[i] = tracker.update(callsign, altitude, now)
+
+    tracker.evict(now)
+    tracker.maybe_snapshot(now)
+    return table